@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Resolve a post URL's domain to its author.
+
+The domain -> author mapping lives in author_domains.json. It is compiled once
+into an exact-host table plus a reversed-label trie for suffix rules (e.g.
+anything under substack.com), and lookups are memoized in a bounded LRU.
+
+Register a new domain without touching code:
+
+    python author_resolver.py add example.substack.com "Jane Doe" https://example.substack.com/
+"""
+
+import json
+import os
+import sys
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from journal import atomic_write_json
+
+AUTHOR_DOMAINS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'author_domains.json')
+
+# Key under which a trie node stores the rule for the suffix ending there
+_RULE = ''
+
+
+class AuthorResolver:
+    """Compiled domain -> (name, url) lookup with exact and suffix matching"""
+
+    def __init__(self, mapping_file: str = AUTHOR_DOMAINS_FILE, cache_size: int = 4096):
+        self.mapping_file = mapping_file
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """(Re)load and compile the mapping file"""
+        if os.path.exists(self.mapping_file):
+            with open(self.mapping_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            data = {}
+        self.domains: Dict[str, Dict] = data.get('domains', {})
+        self.suffixes: Dict[str, Dict] = data.get('suffixes', {})
+        self._compile()
+
+    def _compile(self):
+        self._exact = {domain: (entry['name'], entry['url']) for domain, entry in self.domains.items()}
+        self._trie: Dict = {}
+        for suffix, rule in self.suffixes.items():
+            node = self._trie
+            for label in reversed(suffix.split('.')):
+                node = node.setdefault(label, {})
+            node[_RULE] = rule
+        self._resolve_host = lru_cache(maxsize=self.cache_size)(self._lookup)
+
+    def _match_suffix(self, domain: str) -> Optional[Dict]:
+        """Longest suffix rule matching the domain on label boundaries"""
+        node = self._trie
+        rule = None
+        for label in reversed(domain.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            rule = node.get(_RULE, rule)
+        return rule
+
+    def _lookup(self, domain: str) -> Tuple[str, str]:
+        if domain in self._exact:
+            return self._exact[domain]
+
+        rule = self._match_suffix(domain)
+        if rule is not None:
+            if rule.get('from_subdomain'):
+                # For Substack-style blogs, derive the author from the subdomain
+                subdomain = domain.split('.')[0]
+                return subdomain.replace('-', ' ').title(), f'https://{domain}/'
+            return rule['name'], rule['url']
+
+        # Default: use domain as author
+        return domain.replace('www.', ''), f'https://{domain}/'
+
+    def resolve_host(self, domain: str) -> Dict[str, str]:
+        """Author for a bare domain, e.g. 'mdickens.me'"""
+        name, url = self._resolve_host(domain)
+        return {'name': name, 'url': url}
+
+    def resolve(self, url: str) -> Dict[str, str]:
+        """Author for a post URL"""
+        return self.resolve_host(urlparse(url).netloc)
+
+    def resolve_many(self, urls: Iterable[str]) -> List[Dict[str, str]]:
+        """Resolve authors for many URLs, sharing the memo across them"""
+        return [self.resolve(url) for url in urls]
+
+    def cache_info(self):
+        return self._resolve_host.cache_info()
+
+    def register(self, domain: str, name: str, url: str, persist: bool = True):
+        """Map a domain to an author, optionally saving it to the mapping file"""
+        with self._lock:
+            self.domains[domain] = {'name': name, 'url': url}
+            self._compile()
+            if persist:
+                self.save()
+
+    def register_suffix(self, suffix: str, name: Optional[str] = None, url: Optional[str] = None,
+                        from_subdomain: bool = False, persist: bool = True):
+        """Map every domain under suffix to one author, or derive it from the subdomain"""
+        rule = {'from_subdomain': True} if from_subdomain else {'name': name, 'url': url}
+        with self._lock:
+            self.suffixes[suffix] = rule
+            self._compile()
+            if persist:
+                self.save()
+
+    def save(self):
+        data = {'domains': self.domains, 'suffixes': self.suffixes}
+        atomic_write_json(self.mapping_file, data, indent=2, ensure_ascii=False)
+
+
+_default_resolver: Optional[AuthorResolver] = None
+
+
+def get_resolver() -> AuthorResolver:
+    """Process-wide resolver loaded from author_domains.json"""
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = AuthorResolver()
+    return _default_resolver
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == 'add':
+        _, _, domain, name, url = sys.argv
+        get_resolver().register(domain, name, url)
+        print(f"✓ {domain} -> {name} ({url})")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'lookup':
+        print(get_resolver().resolve(sys.argv[2]))
+    else:
+        print(__doc__)
+        print("Usage: python author_resolver.py add <domain> <name> <url>")
+        print("       python author_resolver.py lookup <post-url>")
+        sys.exit(1)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Benchmark and load-test the Flask API against synthetic corpora.
+
+Generates tagged_posts.json / community_tags.json / author_bios.json corpora
+of the requested sizes, drives every route in server.py through Flask's test
+client and (if gunicorn is installed) through a local gunicorn, and reports
+p50/p95/p99 latency, requests per second and peak RSS per endpoint.
+
+    python bench_api.py --sizes 1000,10000 --output bench_results.json
+    python bench_api.py --sizes 1000 --baseline bench_results.json
+
+Test-client runs measure each endpoint in a fresh process, so peak RSS is
+per endpoint. Gunicorn runs report the high-water RSS summed over the
+master and its workers after each endpoint.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHANGE_LOG_ID = 'bench'
+# Versions asked for by /api/changes; the latest CHANGES_BEHIND changes come back
+CHANGES_BEHIND = 50
+
+TAGS = [
+    'ai-safety', 'technical-ml', 'mathematics', 'statistics', 'biology',
+    'physics', 'chemistry', 'philosophy', 'moral-philosophy', 'technology',
+    'programming', 'politics', 'economics', 'society', 'personal',
+    'life-advice', 'rationality', 'epistemology', 'history', 'art',
+    'literature', 'music', 'psychology', 'neuroscience', 'religion',
+    'education', 'science-fiction', 'games', 'humor', 'travel'
+]
+WORDS = [
+    'alignment', 'model', 'gender', 'notes', 'essay', 'on', 'the', 'of', 'why',
+    'how', 'a', 'inkhaven', 'post', 'day', 'learning', 'writing', 'truth',
+    'world', 'mind', 'travel', 'diary', 'god', 'math', 'proof', 'game', 'love'
+]
+
+
+def generate_corpus(num_posts: int, directory: str, seed: int = 0):
+    """Write synthetic JSON files shaped like the real ones into directory"""
+    rng = random.Random(seed)
+    num_authors = max(10, num_posts // 15)
+    authors = [f'Author {i}' for i in range(num_authors)]
+
+    tagged_posts = {}
+    for i in range(num_posts):
+        author = rng.choice(authors)
+        url = f'https://{author.lower().replace(" ", "")}.substack.com/p/post-{i}'
+        day = 1 + i % 28
+        tagged_posts[url] = {
+            'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 9))).capitalize(),
+            'url': url,
+            'author': author,
+            'date_modified': f'2025-{1 + (i // 28) % 12:02d}-{day:02d}T00:00:00.000Z',
+            'tags': rng.sample(TAGS, rng.randint(1, 4))
+        }
+
+    post_ids = list(tagged_posts)
+    community_tags = {}
+    for post_id in rng.sample(post_ids, num_posts // 20):
+        community_tags[post_id] = [f'community-{rng.randint(0, 50)}' for _ in range(rng.randint(1, 3))]
+        community_tags[post_id] = list(dict.fromkeys(community_tags[post_id]))
+
+    author_bios = {author: f'{author} writes about {", ".join(rng.sample(TAGS, 3))}.' for author in authors}
+
+    # A change log with one entry per community-tagged post, for /api/changes
+    with open(os.path.join(directory, 'changes.jsonl'), 'w') as f:
+        f.write(json.dumps({'log': CHANGE_LOG_ID}) + '\n')
+        for version, post_id in enumerate(community_tags, 1):
+            f.write(json.dumps({'v': version, 'kind': 'community_tag', 'key': post_id}) + '\n')
+
+    for name, data in (('tagged_posts.json', tagged_posts), ('community_tags.json', community_tags),
+                       ('author_bios.json', author_bios)):
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump(data, f, indent=2)
+    return post_ids
+
+
+def request_body(writes, seq):
+    """A unique community tag for write requests, nothing for reads"""
+    return {'tag': f'bench-{os.getpid()}-{seq}'} if writes else None
+
+
+def endpoints(post_ids):
+    """(name, method, path, writes) for every route in server.py
+
+    {bootstrap_version}, {snapshot_version} and {since} in a path are filled
+    in by resolve_path just before the endpoint is measured.
+    """
+    sample_id = urllib.parse.quote(post_ids[0], safe='')
+    return [
+        ('index', 'GET', '/', False),
+        ('bootstrap', 'GET', '/api/bootstrap', False),
+        ('bootstrap-versioned', 'GET', '/api/bootstrap?v={bootstrap_version}', False),
+        ('search-index', 'GET', '/api/search-index', False),
+        ('search-index-versioned', 'GET', '/api/search-index?v={snapshot_version}', False),
+        ('facets', 'GET', '/api/facets', False),
+        ('changes', 'GET', f'/api/changes?since={{since}}&log={CHANGE_LOG_ID}', False),
+        ('posts', 'GET', '/api/posts', False),
+        ('posts-stream', 'GET', '/api/posts?stream=1', False),
+        ('posts-ndjson', 'GET', '/api/posts?format=ndjson', False),
+        ('tags', 'GET', '/api/tags', False),
+        ('authors', 'GET', '/api/authors', False),
+        ('community-tags', 'GET', '/api/community-tags', False),
+        ('author-bios', 'GET', '/api/author-bios', False),
+        ('store-stats', 'GET', '/api/store-stats', False),
+        ('search-facets', 'GET', '/api/search?tag=ai-safety&tag=travel&author=Author+1&limit=50', False),
+        ('search-title', 'GET', '/api/search?q=the+mo&limit=50', False),
+        ('add-community-tag', 'POST', f'/api/community-tags/{sample_id}', True),
+    ]
+
+
+def resolve_path(path, get_json):
+    """Fill in the current versions, read from an unversioned /api/bootstrap"""
+    if '{' not in path:
+        return path
+    bootstrap = get_json('/api/bootstrap')
+    return path.format(
+        bootstrap_version=f"{bootstrap['version']}-{bootstrap['change_log']}-{bootstrap['change_version']}",
+        snapshot_version=bootstrap['version'],
+        since=max(bootstrap['change_version'] - CHANGES_BEHIND, 0),
+    )
+
+
+def summarize(latencies, elapsed, peak_rss_kb):
+    latencies = sorted(latencies)
+    q = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(q[49] * 1000, 3),
+        'p95_ms': round(q[94] * 1000, 3),
+        'p99_ms': round(q[98] * 1000, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        'peak_rss_mb': round(peak_rss_kb / 1024, 1) if peak_rss_kb else None,
+    }
+
+
+# Flask test client
+
+def _client_worker(corpus_dir, endpoint, num_requests, queue):
+    os.chdir(corpus_dir)
+    sys.path.insert(0, REPO_DIR)
+    import server
+
+    name, method, path, writes = endpoint
+    client = server.app.test_client()
+    path = resolve_path(path, lambda url: client.get(url).get_json())
+    started = time.perf_counter()
+    cold = client.open(path, method=method, json=request_body(writes, -1))
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(num_requests):
+        t0 = time.perf_counter()
+        response = client.open(path, method=method, json=request_body(writes, i))
+        response.get_data()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    result.update({'status': cold.status_code, 'cold_ms': round(cold_ms, 3)})
+    queue.put(result)
+
+
+def run_test_client(corpus_dir, post_ids, num_requests):
+    ctx = multiprocessing.get_context('spawn')
+    results = {}
+    for endpoint in endpoints(post_ids):
+        queue = ctx.Queue()
+        process = ctx.Process(target=_client_worker, args=(corpus_dir, endpoint, num_requests, queue))
+        process.start()
+        results[endpoint[0]] = queue.get()
+        process.join()
+        print(f"    {endpoint[0]:<22} {_format(results[endpoint[0]])}")
+    return results
+
+
+# Local gunicorn
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _process_tree_rss_kb(root_pid):
+    """High-water RSS (VmHWM) summed over a process and its children"""
+    pids = {root_pid}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == root_pid:
+                        pids.add(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+def _http(base, method, path, body):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+        return response.status
+
+
+def _http_json(base, path):
+    with urllib.request.urlopen(base + path, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def run_gunicorn(corpus_dir, post_ids, num_requests, workers, concurrency):
+    gunicorn = shutil.which('gunicorn')
+    if gunicorn is None:
+        print("    gunicorn not installed; skipping")
+        return None
+
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen(
+        [gunicorn, '--chdir', corpus_dir, '--pythonpath', REPO_DIR, '-w', str(workers),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'server:app'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                _http(base, 'GET', '/api/store-stats', None)
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+
+        results = {}
+        for name, method, path, writes in endpoints(post_ids):
+            path = resolve_path(path, lambda url: _http_json(base, url))
+
+            def one(seq):
+                t0 = time.perf_counter()
+                _http(base, method, path, request_body(writes, seq))
+                return time.perf_counter() - t0
+
+            _http(base, method, path, request_body(writes, -1))  # warm the answering worker
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(one, range(num_requests)))
+            elapsed = time.perf_counter() - started
+            results[name] = summarize(latencies, elapsed, _process_tree_rss_kb(process.pid))
+            print(f"    {name:<22} {_format(results[name])}")
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def reset_corpus(size, corpus_dir):
+    """Undo the write benchmark's tags and change log entries"""
+    generate_corpus(size, corpus_dir)
+    for name in os.listdir(corpus_dir):
+        if name.endswith('.journal.jsonl'):
+            os.remove(os.path.join(corpus_dir, name))
+
+
+# Reporting
+
+def _format(result):
+    return (f"p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+            f"p99 {result['p99_ms']:>9.2f}ms  {result['rps'] or 0:>8.1f} req/s  "
+            f"{result['peak_rss_mb'] or 0:>7.1f} MB")
+
+
+def compare(results, baseline, threshold):
+    """List endpoints whose p95 or throughput regressed by more than threshold"""
+    regressions = []
+    for mode, sizes in results.items():
+        for size, by_endpoint in (sizes or {}).items():
+            for name, current in (by_endpoint or {}).items():
+                previous = ((baseline.get(mode) or {}).get(size) or {}).get(name)
+                if not previous:
+                    continue
+                if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                    regressions.append(f"{mode}/{size}/{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+                if previous.get('rps') and current.get('rps') and current['rps'] < previous['rps'] * (1 - threshold):
+                    regressions.append(f"{mode}/{size}/{name}: {previous['rps']} -> {current['rps']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000', help="comma-separated corpus sizes")
+    parser.add_argument('--requests', type=int, default=50, help="measured requests per endpoint")
+    parser.add_argument('--modes', default='client,gunicorn',
+                        help="any of client, gunicorn and mapped (gunicorn serving a published snapshot.bin)")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent requests against gunicorn")
+    parser.add_argument('--output', default='bench_results.json', help="where to save results")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    modes = args.modes.split(',')
+    results = {mode: {} for mode in modes}
+
+    for size in sizes:
+        corpus_dir = tempfile.mkdtemp(prefix=f'inkhaven-bench-{size}-')
+        try:
+            print(f"\nCorpus: {size} posts ({corpus_dir})")
+            post_ids = generate_corpus(size, corpus_dir)
+            shutil.copy(os.path.join(REPO_DIR, 'index.html'), corpus_dir)
+            if 'client' in modes:
+                print("  Flask test client")
+                results['client'][str(size)] = run_test_client(corpus_dir, post_ids, args.requests)
+                reset_corpus(size, corpus_dir)
+            if 'gunicorn' in modes:
+                print(f"  gunicorn ({args.workers} workers, concurrency {args.concurrency})")
+                results['gunicorn'][str(size)] = run_gunicorn(
+                    corpus_dir, post_ids, args.requests, args.workers, args.concurrency)
+                reset_corpus(size, corpus_dir)
+            if 'mapped' in modes:
+                print(f"  gunicorn with snapshot.bin ({args.workers} workers, concurrency {args.concurrency})")
+                subprocess.run([sys.executable, os.path.join(REPO_DIR, 'snapshot_file.py'), 'publish'],
+                               cwd=corpus_dir, check=True, stdout=subprocess.DEVNULL)
+                results['mapped'][str(size)] = run_gunicorn(
+                    corpus_dir, post_ids, args.requests, args.workers, args.concurrency)
+        finally:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'requests_per_endpoint': args.requests,
+            'gunicorn_workers': args.workers,
+            'concurrency': args.concurrency,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"✓ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
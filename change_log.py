@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Monotonically versioned log of what changed, for client delta sync.
+
+Every write that changes what the page shows (a post tagged by the tagger, a
+community tag added through the API, a new author bio) appends one line to
+changes.jsonl with the next version number and the key that changed. Clients
+remember the last version they saw and ask /api/changes?since=N for the keys
+changed after it; the server answers with the current values from its
+snapshot. The log is trimmed to its most recent entries, so a client that is
+too far behind is told to resync from /api/bootstrap instead.
+
+The first line holds a random id for the log. Versions only mean something
+within one log: if changes.jsonl is lost (e.g. on a redeploy) numbering starts
+again at 1 under a new id, and clients holding the old id resync. A reset
+also starts a new id, keeping the version numbering.
+
+After editing the data files by hand (or importing into SQLite), force every
+client to resync with:
+
+    python change_log.py reset
+"""
+
+import json
+import os
+import secrets
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from journal import JsonJournal, file_lock
+
+CHANGES_FILE = 'changes.jsonl'
+
+# Kinds of change; 'reset' invalidates everything before it
+POST = 'post'
+COMMUNITY_TAG = 'community_tag'
+BIO = 'bio'
+RESET = 'reset'
+
+
+class ChangeLog:
+    """Append-only, versioned record of changed post ids and authors"""
+
+    def __init__(self, path: str = CHANGES_FILE, keep: int = 5000):
+        self.path = path
+        self.journal = JsonJournal(path)
+        self.lock_file = path + '.lock'
+        # Entries kept when trimming; older clients have to resync
+        self.keep = keep
+        self._lock = threading.Lock()
+        # (inode, bytes read, log id, entries) of the file as last read
+        self._state: Tuple[Optional[int], int, str, List[Dict]] = (None, 0, '', [])
+
+    def _read(self) -> Tuple[str, List[Dict]]:
+        """The log id and parsed entries, reading only what was appended since the last call"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            with self._lock:
+                self._state = (None, 0, '', [])
+            return '', []
+        with self._lock:
+            inode, offset, log_id, entries = self._state
+            if inode == st.st_ino and offset == st.st_size:
+                return log_id, entries
+            records = None
+            if inode == st.st_ino and offset < st.st_size:
+                records, new_offset = self.journal.read_from(offset)
+                # A trimmed file can reuse the inode; versions only run on within one file
+                if records and entries and records[0].get('v') != entries[-1]['v'] + 1:
+                    records = None
+            if records is None:
+                records, new_offset = self.journal.read_from(0)
+                records = records or []
+                # The first line names the log; files from before log ids have none
+                log_id = records.pop(0).get('log', '') if records and 'v' not in records[0] else ''
+                entries = records
+            else:
+                entries = entries + records
+            self._state = (st.st_ino, new_offset, log_id, entries)
+            return log_id, entries
+
+    def _entries(self) -> List[Dict]:
+        return self._read()[1]
+
+    def head(self) -> int:
+        """Latest change version (0 before anything has been recorded)"""
+        return self.current()[1]
+
+    def current(self) -> Tuple[str, int]:
+        """The log id and latest change version; clients need both to ask for changes"""
+        log_id, entries = self._read()
+        return log_id, entries[-1]['v'] if entries else 0
+
+    def record(self, kind: str, key: str) -> int:
+        """Append one change and return its version"""
+        return self.record_many(kind, [key])
+
+    def record_many(self, kind: str, keys: List[str]) -> int:
+        """Append changes for several keys under one lock, returning the last version"""
+        with file_lock(self.lock_file):
+            log_id, entries = self._read()
+            if not log_id and not entries:
+                # A new log (e.g. after a redeploy) restarts at version 1, so it gets a new id
+                self.journal.append({'log': secrets.token_hex(8)})
+            version = entries[-1]['v'] if entries else 0
+            for key in keys:
+                version += 1
+                self.journal.append({'v': version, 'kind': kind, 'key': key})
+            if len(entries) + len(keys) > 2 * self.keep:
+                self._trim()
+        return version
+
+    def _trim(self):
+        """Keep only the newest `keep` entries (called with the file lock held)"""
+        log_id, entries = self._read()
+        self._rewrite(log_id, entries[-self.keep:])
+
+    def _rewrite(self, log_id: str, entries: List[Dict]):
+        """Replace the file atomically (called with the file lock held)"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = os.path.join(directory, f'.{os.path.basename(self.path)}.trim')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if log_id:
+                f.write(json.dumps({'log': log_id}) + '\n')
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def reset(self) -> int:
+        """Make every client that synced before now do a full resync
+
+        Starts a new log id; versions carry on, so versioned bootstrap URLs change too.
+        """
+        with file_lock(self.lock_file):
+            _, entries = self._read()
+            version = (entries[-1]['v'] if entries else 0) + 1
+            self._rewrite(secrets.token_hex(8), [{'v': version, 'kind': RESET, 'key': ''}])
+        return version
+
+    def since(self, version: int, log_id: str) -> Tuple[str, int, Optional[Dict[str, List[str]]]]:
+        """The log id, the latest version, and the keys changed after `version` grouped by kind
+
+        The keys are None when the client must resync: its version is from
+        another log, predates the retained log, is ahead of it, or a reset
+        happened since.
+        """
+        current_id, entries = self._read()
+        head = entries[-1]['v'] if entries else 0
+        oldest = entries[0]['v'] if entries else 1
+        if log_id != current_id or version > head or version < oldest - 1:
+            return current_id, head, None
+
+        changed: Dict[str, List[str]] = {POST: [], COMMUNITY_TAG: [], BIO: []}
+        seen = set()
+        for entry in entries:
+            if entry['v'] <= version:
+                continue
+            if entry['kind'] == RESET:
+                return current_id, head, None
+            if (entry['kind'], entry['key']) not in seen:
+                seen.add((entry['kind'], entry['key']))
+                changed.setdefault(entry['kind'], []).append(entry['key'])
+        return current_id, head, changed
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ['reset']:
+        print(__doc__)
+        sys.exit(1)
+    from snapshot_file import republish
+    from sqlite_store import SQLiteStore, configured_db_path
+
+    version = ChangeLog().reset()
+    print(f"✓ Change log reset at version {version} under a new log id; clients will resync")
+    # A published snapshot.bin embeds the change version in its bootstrap payload
+    db_path = configured_db_path()
+    republish(db=SQLiteStore(db_path) if db_path else None)
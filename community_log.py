@@ -0,0 +1,66 @@
+"""
+Append-only write path for community tags.
+
+Each new tag is appended to community_tags.journal.jsonl under a file lock
+instead of rewriting all of community_tags.json, so write cost stays flat as
+tagging grows and concurrent gunicorn workers cannot drop each other's tags.
+Readers fold the log over the last snapshot; once the log grows past a size
+threshold it is compacted into community_tags.json on a background thread.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List
+
+from journal import JsonJournal, atomic_write_json, file_lock, journal_path_for, load_json_file
+
+COMMUNITY_TAGS_FILE = 'community_tags.json'
+
+
+def fold_events(community_tags: Dict[str, List[str]], events: Iterable[Dict]) -> Dict[str, List[str]]:
+    """Apply tag events to a post_id -> tags map, ignoring duplicates"""
+    for event in events:
+        tags = community_tags.setdefault(event['post_id'], [])
+        if event['tag'] not in tags:
+            tags.append(event['tag'])
+    return community_tags
+
+
+class CommunityTagLog:
+    """Serialized, append-only writer for community tags"""
+
+    def __init__(self, snapshot_file: str = COMMUNITY_TAGS_FILE, compact_bytes: int = 64 * 1024):
+        self.snapshot_file = snapshot_file
+        self.journal = JsonJournal(journal_path_for(snapshot_file))
+        self.lock_file = snapshot_file + '.lock'
+        self.compact_bytes = compact_bytes
+        self._compacting = threading.Lock()
+
+    def add(self, post_id: str, tag: str):
+        """Record a tag for a post; duplicates are harmless and dropped on fold"""
+        with file_lock(self.lock_file):
+            self.journal.append({'post_id': post_id, 'tag': tag, 'ts': time.time()})
+        if self.journal.size() >= self.compact_bytes:
+            self.compact_in_background()
+
+    def compact(self):
+        """Fold the log into community_tags.json and truncate it"""
+        with file_lock(self.lock_file):
+            if not self.journal.size():
+                return
+            community_tags = fold_events(load_json_file(self.snapshot_file), self.journal.replay())
+            atomic_write_json(self.snapshot_file, community_tags, indent=2)
+            self.journal.clear()
+
+    def compact_in_background(self):
+        """Start a compaction unless one is already running in this process"""
+        if not self._compacting.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting.release()
+
+        threading.Thread(target=run, name='community-tag-compaction', daemon=True).start()
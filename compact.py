@@ -0,0 +1,178 @@
+"""
+Compact in-memory post records for the server and tagger.
+
+A Post keeps its fields in __slots__ instead of a per-post dict, with author,
+tag and date strings interned so each distinct value is stored once per
+process. The date is parsed once into an integer sort key, and the tags are
+also kept as a bitmask over a process-wide tag numbering for cheap filtering.
+
+Posts behave like read-only dicts (post['title'], post.get('tags'), {**post})
+and serialize to exactly the dict the API has always returned via
+json_default, which http_cache and the server's JSON provider use.
+"""
+
+import sys
+import threading
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Tuple
+
+FIELDS = ('title', 'url', 'author', 'date_modified', 'tags')
+
+_tag_bits: Dict[str, int] = {}
+_tag_bits_lock = threading.Lock()
+
+
+def intern_tags(tags: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(sys.intern(tag) for tag in tags)
+
+
+def tag_bit(tag: str) -> int:
+    """The bit for a tag, numbering tags in the order they are first seen"""
+    bit = _tag_bits.get(tag)
+    if bit is None:
+        with _tag_bits_lock:
+            bit = _tag_bits.setdefault(tag, 1 << len(_tag_bits))
+    return bit
+
+
+def tag_mask(tags: Iterable[str]) -> int:
+    """Bitmask of tags that have been seen; unknown tags match nothing"""
+    mask = 0
+    for tag in tags:
+        mask |= _tag_bits.get(tag, 0)
+    return mask
+
+
+# Many posts share a date string, so each distinct one is parsed once
+@lru_cache(maxsize=65536)
+def date_key(value: str) -> int:
+    """Microseconds since the epoch for an ISO date, 0 if missing or unparseable"""
+    if not value:
+        return 0
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    delta = parsed - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def intern_record(post_data: Dict) -> Dict:
+    """Intern the repeated strings of a cached {title, url, author, date_modified, tags} record in place"""
+    for key in ('author', 'date_modified'):
+        if isinstance(post_data.get(key), str):
+            post_data[key] = sys.intern(post_data[key])
+    if isinstance(post_data.get('tags'), list):
+        post_data['tags'] = [sys.intern(tag) for tag in post_data['tags']]
+    return post_data
+
+
+class Post(Mapping):
+    """One post with community tags merged, stored in slots"""
+
+    __slots__ = ('id', 'title', 'url', 'author', 'date_modified', 'tags', 'community_tags',
+                 'timestamp', 'tag_mask', 'extra')
+
+    @classmethod
+    def from_record(cls, post_id: str, post_data: Dict) -> 'Post':
+        """Build a post from a cached record; fields it lacks stay absent"""
+        post = cls.__new__(cls)
+        post.id = post_id
+        post.title = post_data.get('title')
+        url = post_data.get('url')
+        # The id is normally the URL; keep one string for both
+        post.url = post_id if url == post_id else url
+        author = post_data.get('author')
+        post.author = sys.intern(author) if isinstance(author, str) else author
+        date_modified = post_data.get('date_modified')
+        post.date_modified = sys.intern(date_modified) if isinstance(date_modified, str) else date_modified
+        tags = post_data.get('tags')
+        post.tags = intern_tags(tags) if tags is not None else None
+        post.community_tags = ()
+        post.timestamp = date_key(date_modified) if isinstance(date_modified, str) else 0
+        mask = 0
+        for tag in post.tags or ():
+            mask |= tag_bit(tag)
+        post.tag_mask = mask
+        extra = {key: value for key, value in post_data.items() if key not in FIELDS and key != 'id'}
+        post.extra = extra or None
+        return post
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'Post':
+        """Build a post back from the object it serializes to"""
+        post_id = data.pop('id')
+        community_tags = data.pop('community_tags', ())
+        post = cls.from_record(post_id, data)
+        if community_tags:
+            post.community_tags = intern_tags(community_tags)
+        return post
+
+    def with_community_tags(self, community_tags: Iterable[str]) -> 'Post':
+        """A copy of this post with its community tags replaced"""
+        post = Post.__new__(Post)
+        for slot in Post.__slots__:
+            setattr(post, slot, getattr(self, slot))
+        post.community_tags = intern_tags(community_tags)
+        return post
+
+    def _items(self) -> Iterator[Tuple[str, object]]:
+        # Same keys, in the same order, as the dicts the API used to build
+        yield 'id', self.id
+        for key in FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                yield key, value
+        if self.extra:
+            yield from self.extra.items()
+        yield 'community_tags', self.community_tags
+
+    def __getitem__(self, key: str):
+        if key in ('id', 'community_tags') or key in FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key, _ in self._items())
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._items())
+
+    def to_dict(self) -> Dict:
+        if self.extra or None in (self.title, self.url, self.author, self.date_modified, self.tags):
+            return dict(self._items())
+        # Called once per post whenever posts are serialized, so skip the generator
+        return {'id': self.id, 'title': self.title, 'url': self.url, 'author': self.author,
+                'date_modified': self.date_modified, 'tags': self.tags,
+                'community_tags': self.community_tags}
+
+    def __repr__(self) -> str:
+        return f'Post({self.to_dict()!r})'
+
+
+def as_post(post_id: str, post_data) -> Post:
+    """Posts pass through; plain cached records are converted"""
+    return post_data if isinstance(post_data, Post) else Post.from_record(post_id, post_data)
+
+
+def load_posts(tagged_posts: Dict[str, Dict]) -> Dict[str, Post]:
+    """Convert a parsed tagged_posts.json into posts"""
+    return {post_id: Post.from_record(post_id, post_data) for post_id, post_data in tagged_posts.items()}
+
+
+def json_default(obj):
+    """`default` hook for json.dumps that serializes posts as plain objects"""
+    if isinstance(obj, Post):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
@@ -4,129 +4,56 @@ Convert inkhaven_updated.xml (RSS format) to inkhaven_feed.json (JSON Feed forma
 """
 
 import xml.etree.ElementTree as ET
+import argparse
 import json
+import os
 from datetime import datetime
-from urllib.parse import urlparse
-import re
+
+from author_resolver import get_resolver
+from journal import atomic_write_json
 
 def extract_author_from_url(url):
     """Extract author name and blog URL from post URL"""
-    parsed = urlparse(url)
-    domain = parsed.netloc
-    
-    # Comprehensive author mapping from existing JSON feed
-    author_mapping = {
-        'aelerinya.substack.com': ('Lucie Philippon', 'https://aelerinya.substack.com'),
-        'agarriga.substack.com': ('Adrià Garriga Alonso', 'https://substack.com/@columnspace'),
-        'agifriday.substack.com': ('Daniel Reeves', 'https://blog.beeminder.com/'),
-        'alignmentforum.org': ('Alignment Forum', 'https://www.alignmentforum.org/'),
-        'www.alignmentforum.org': ('Alignment Forum', 'https://www.alignmentforum.org/'),
-        'angadh.com': ('Angadh Nanjangud', 'https://angadh.com/'),
-        'anthropic.ml': ('Anthropic', 'https://anthropic.ml/'),
-        'archiveofourown.org': ('Justin Kuiper', 'https://justinkuiper.substack.com/'),
-        'asourdays.substack.com': ('William Friedman', 'https://asourdays.substack.com/'),
-        'befriendjamin.substack.com': ('Ben Steinhorn', 'https://befriendjamin.substack.com/'),
-        'bengoldhaber.substack.com': ('Ben Goldhaber', 'https://bengoldhaber.substack.com/'),
-        'bestjelly.substack.com': ('Harri Besceli', 'https://bestjelly.substack.com/'),
-        'blog.beeminder.com': ('Daniel Reeves', 'https://blog.beeminder.com/'),
-        'boardgamegeek.com': ('Vaniver', 'https://www.lesswrong.com/users/vaniver'),
-        'camilleberger.substack.com': ('Camille Berger', 'https://camilleberger.substack.com/?sort=top'),
-        'collisteru.net': ('Sean Carter', 'https://collisteru.substack.com/'),
-        'collisteru.substack.com': ('Sean Carter', 'https://collisteru.substack.com/'),
-        'comments.ustr.gov': ('Jenn', 'https://jenn.site/'),
-        'complexityzoo.net': ('Harri Besceli', 'https://bestjelly.substack.com/'),
-        'croissanthology.com': ('Croissanthology', 'http://croissanthology.com/'),
-        'croissanthology.substack.com': ('Croissanthology', 'http://croissanthology.com/'),
-        'dactile.net': ('David Gros', 'https://dactile.net'),
-        'danielpaleka.com': ('Daniel Paleka', 'https://danielpaleka.com/inkhaven'),
-        'daystareld.com': ('Damon Sasi', 'https://daystareld.com/'),
-        'deathisbad.substack.com': ('Eneasz Brodski', 'https://deathisbad.substack.com/'),
-        'futuring.substack.com': ('Raye', 'https://futuring.substack.com/'),
-        'hauke.substack.com': ('Hauke Hillebrandt', 'https://hauke.substack.com/'),
-        'hfh.pw': ('Hauke Hillebrandt', 'https://hauke.substack.com/'),
-        'www.hfh.pw': ('Hauke Hillebrandt', 'https://hauke.substack.com/'),
-        'huggingface.co': ('Daniel Paleka', 'https://danielpaleka.com/inkhaven'),
-        'humaninvariant.substack.com': ('Human Invariant', 'https://www.humaninvariant.com/'),
-        'www.humaninvariant.com': ('Human Invariant', 'https://www.humaninvariant.com/'),
-        'inchpin.substack.com': ('Linch Zhang', 'https://linch.substack.com/'),
-        'inkhavenspotlight.substack.com': ('Ben Pace', 'https://www.lesswrong.com/users/benito'),
-        'jenn.site': ('Jenn', 'https://jenn.site/'),
-        'www.jenn.site': ('Jenn', 'https://jenn.site/'),
-        'joannabregan.medium.com': ('Joanna Bregan', 'https://joannabregan.substack.com/'),
-        'joannabregan.substack.com': ('Joanna Bregan', 'https://joannabregan.substack.com/'),
-        'justinkuiper.substack.com': ('Justin Kuiper', 'https://justinkuiper.substack.com/'),
-        'justismills.substack.com': ('Justis Mills', 'https://justismills.substack.com/'),
-        'kaverennedy.substack.com': ('Kave Rennedy', 'https://kaverennedy.substack.com'),
-        'kuiperblog.tumblr.com': ('Justin Kuiper', 'https://justinkuiper.substack.com/'),
-        'letterboxd.com': ('Justin Kuiper', 'https://justinkuiper.substack.com/'),
-        'lettersfrombethlehem.substack.com': ('Amanda Luce', 'https://lettersfrombethlehem.substack.com/'),
-        'life-in-a-monospace-typeface.tumblr.com': ('Rob Miles', 'https://life-in-a-monospace-typeface.tumblr.com/'),
-        'linch.substack.com': ('Linch Zhang', 'https://linch.substack.com/'),
-        'lucent.substack.com': ('Michael Dayah', 'https://lucent.substack.com/'),
-        'lucent.vision': ('Michael Dayah', 'https://lucent.substack.com/'),
-        'lydia.ml': ('Lydia Nottingham', 'https://lydianottingham.substack.com/'),
-        'lydianottingham.substack.com': ('Lydia Nottingham', 'https://lydianottingham.substack.com/'),
-        'markusstrasser.org': ('Markus Strasser', 'https://markusstrasser.org/'),
-        'mdickens.me': ('Michael Dickens', 'https://mdickens.me/'),
-        'mikhailsamin.substack.com': ('Mikhail Samin', 'https://mikhailsamin.substack.com/'),
-        'mingyuan.substack.com': ('Claire Wang', 'https://mingyuan.substack.com/'),
-        'mynamelowercase.com': ('Mahmoud Ghanem', 'https://mynamelowercase.com/'),
-        'mynamelowercase.mataroa.blog': ('Mahmoud Ghanem', 'https://mynamelowercase.com/'),
-        'namelessvirtue.com': ('Alex Altair', 'https://namelessvirtue.com/'),
-        'newsletter.danielpaleka.com': ('Daniel Paleka', 'https://danielpaleka.com/inkhaven'),
-        'nikolajurkovic.substack.com': ('Nikola Jurkovic', 'https://substack.com/@nikolajurkovic'),
-        'nomadsvagabonds.substack.com': ('Nomads and Vagabonds', 'https://nomadsvagabonds.substack.com/'),
-        'old.reddit.com': ('Oliver Habryka', 'https://www.lesswrong.com/users/habryka4'),
-        'open.substack.com': ('Substack Open', 'https://open.substack.com/'),
-        'psychotechnology.substack.com': ('Psychotechnology', 'https://psychotechnology.substack.com/'),
-        'radimentary.wordpress.com': ('alkjash', 'https://radimentary.wordpress.com/'),
-        'reddit.com': ('Oliver Habryka', 'https://www.lesswrong.com/users/habryka4'),
-        'www.reddit.com': ('Oliver Habryka', 'https://www.lesswrong.com/users/habryka4'),
-        'rivalvoices.substack.com': ('Rival Voices', 'https://rivalvoices.substack.com/'),
-        'sexmoneyart.com': ('Sacha Witt', 'https://www.sexmoneyart.com/'),
-        'www.sexmoneyart.com': ('Sacha Witt', 'https://www.sexmoneyart.com/'),
-        'signoregalilei.com': ('Signore Galilei', 'https://signoregalilei.com/'),
-        'simonlermen.substack.com': ('Simon Lermen', 'https://simonlermen.substack.com/'),
-        'thought37.com': ('Ruben Bloom', 'https://www.thought37.com/'),
-        'www.thought37.com': ('Ruben Bloom', 'https://www.thought37.com/'),
-        'tomasbjartur.bearblog.dev': ('Tomás Bjartur', 'https://tomasbjartur.bearblog.dev/'),
-        'tsvibt.blogspot.com': ('Tsvi Benson-Tilsen', 'https://tsvibt.blogspot.com/'),
-        'tsvibt.github.io': ('Tsvi Benson-Tilsen', 'https://tsvibt.blogspot.com/'),
-        'vishalblog.substack.com': ('Vishal', 'https://vishalblog.substack.com/'),
-        'www.lesswrong.com': ('LessWrong', 'https://www.lesswrong.com/'),
-        'www.mutuallyassuredseduction.com': ('Mutually Assured Seduction', 'https://www.mutuallyassuredseduction.com/'),
-        'x.com': ('X Post', 'https://x.com/'),
-    }
+    # The domain mapping lives in author_domains.json; see author_resolver.py
+    return get_resolver().resolve(url)
+
+def rss_item_to_json(item):
+    """Convert one RSS <item> element to a JSON Feed item"""
+    title_elem = item.find('title')
+    link_elem = item.find('link')
+    guid_elem = item.find('guid')
+    pub_date_elem = item.find('pubDate')
     
-    # Check if domain is in mapping
-    if domain in author_mapping:
-        return {
-            'name': author_mapping[domain][0],
-            'url': author_mapping[domain][1]
-        }
+    # Extract data
+    title = title_elem.text if title_elem is not None else "Untitled"
+    url = link_elem.text if link_elem is not None else ""
+    guid = guid_elem.text if guid_elem is not None else url
+    pub_date = pub_date_elem.text if pub_date_elem is not None else ""
     
-    # For LessWrong and other sites, extract from domain
-    if 'lesswrong.com' in domain:
-        return {
-            'name': 'LessWrong',
-            'url': 'https://www.lesswrong.com/'
-        }
+    # Convert pub_date to ISO format
+    date_modified = pub_date  # Keep as-is for now, could parse if needed
+    if pub_date:
+        try:
+            # Parse RSS date format: "Mon, 01 Dec 2025 00:00:00 GMT"
+            dt = datetime.strptime(pub_date, "%a, %d %b %Y %H:%M:%S %Z")
+            date_modified = dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        except:
+            pass
     
-    # For Substack blogs, extract author from subdomain
-    if 'substack.com' in domain:
-        subdomain = domain.split('.')[0]
-        author_name = subdomain.replace('-', ' ').title()
-        return {
-            'name': author_name,
-            'url': f'https://{domain}/'
-        }
+    # Extract author from URL
+    author = extract_author_from_url(url)
     
-    # Default: use domain as author
-    clean_domain = domain.replace('www.', '')
-    return {
-        'name': clean_domain,
-        'url': f'https://{domain}/'
+    # Create item
+    json_item = {
+        "id": guid,
+        "content_html": "",
+        "url": url,
+        "title": title,
+        "date_modified": date_modified,
+        "author": author
     }
+    
+    return json_item
 
 def convert_rss_to_json_feed(xml_file, json_file):
     """Convert RSS XML feed to JSON Feed format"""
@@ -153,41 +80,7 @@ def convert_rss_to_json_feed(xml_file, json_file):
     print(f"Converting {len(items)} items from XML to JSON...")
     
     for item in items:
-        title_elem = item.find('title')
-        link_elem = item.find('link')
-        guid_elem = item.find('guid')
-        pub_date_elem = item.find('pubDate')
-        
-        # Extract data
-        title = title_elem.text if title_elem is not None else "Untitled"
-        url = link_elem.text if link_elem is not None else ""
-        guid = guid_elem.text if guid_elem is not None else url
-        pub_date = pub_date_elem.text if pub_date_elem is not None else ""
-        
-        # Convert pub_date to ISO format
-        date_modified = pub_date  # Keep as-is for now, could parse if needed
-        if pub_date:
-            try:
-                # Parse RSS date format: "Mon, 01 Dec 2025 00:00:00 GMT"
-                dt = datetime.strptime(pub_date, "%a, %d %b %Y %H:%M:%S %Z")
-                date_modified = dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-            except:
-                pass
-        
-        # Extract author from URL
-        author = extract_author_from_url(url)
-        
-        # Create item
-        json_item = {
-            "id": guid,
-            "content_html": "",
-            "url": url,
-            "title": title,
-            "date_modified": date_modified,
-            "author": author
-        }
-        
-        feed["items"].append(json_item)
+        feed["items"].append(rss_item_to_json(item))
     
     # Write JSON file
     with open(json_file, 'w', encoding='utf-8') as f:
@@ -196,7 +89,119 @@ def convert_rss_to_json_feed(xml_file, json_file):
     print(f"✓ Converted {len(feed['items'])} items")
     print(f"✓ Saved to {json_file}")
 
+def iter_rss(xml_file):
+    """Stream (channel_metadata, item) pairs from an RSS file without building the whole tree
+
+    Yields ('meta', {tag: text}) once the channel header has been read, then
+    ('item', element) for every <item>. Item elements are cleared after the
+    caller has consumed them, so memory stays flat regardless of feed size.
+    """
+    meta = {}
+    meta_sent = False
+    path = []
+    channel = None
+    for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem.tag)
+            if elem.tag == 'channel':
+                channel = elem
+            continue
+
+        path.pop()
+        if path == ['rss', 'channel'] and elem.tag != 'item':
+            meta[elem.tag] = elem.text
+        elif elem.tag == 'item' and path == ['rss', 'channel']:
+            if not meta_sent:
+                meta_sent = True
+                yield 'meta', meta
+            yield 'item', elem
+            elem.clear()
+            channel.remove(elem)
+
+    if not meta_sent:
+        yield 'meta', meta
+
+def ingest_rss_incremental(xml_file, json_file, stop_at_known=False):
+    """Merge only new or changed RSS items into an existing JSON Feed
+
+    Streams the RSS with iterparse and skips GUIDs already in json_file. With
+    stop_at_known, parsing stops at the first known GUID, which is safe for
+    feeds ordered newest first. Returns added/updated/unchanged counts, where
+    unchanged only counts items compared against the RSS, plus a skipped count
+    of feed items that were not (past the stop point, or not in the RSS).
+    """
+    if os.path.exists(json_file):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            feed = json.load(f)
+    else:
+        feed = None
+    existing = {}
+    for i, item in enumerate(feed['items'] if feed else []):
+        existing.setdefault(item['id'], i)
+
+    new_items = []
+    seen = set()
+    updated = 0
+    unchanged = 0
+    for kind, value in iter_rss(xml_file):
+        if kind == 'meta':
+            if feed is None:
+                feed = {
+                    "version": "https://jsonfeed.org/version/1",
+                    "title": value.get('title') or "Inkhaven Residency Publications",
+                    "home_page_url": value.get('link') or "https://inkhaven.com/",
+                    "feed_url": "https://inkhaven.com/feed.json",
+                    "description": value.get('description') or "Latest publications from Inkhaven Residency writers",
+                    "items": []
+                }
+            continue
+
+        guid_elem = value.find('guid')
+        link_elem = value.find('link')
+        guid = guid_elem.text if guid_elem is not None else (link_elem.text if link_elem is not None else "")
+        if guid in seen:
+            continue  # Duplicate within the RSS itself
+        seen.add(guid)
+        if guid in existing:
+            if stop_at_known:
+                break
+            json_item = rss_item_to_json(value)
+            index = existing[guid]
+            if feed['items'][index] != json_item:
+                feed['items'][index] = json_item
+                updated += 1
+            else:
+                unchanged += 1
+        else:
+            new_items.append(rss_item_to_json(value))
+
+    counts = {
+        'added': len(new_items),
+        'updated': updated,
+        'unchanged': unchanged,
+        'skipped': len(feed['items']) - updated - unchanged,
+    }
+    # The feed is newest first, so new items go in front in feed order
+    feed['items'][:0] = new_items
+
+    if new_items or updated or not os.path.exists(json_file):
+        atomic_write_json(json_file, feed, indent=4, ensure_ascii=False)
+        print(f"✓ Saved to {json_file}")
+    print(f"✓ Added {counts['added']}, updated {counts['updated']}, unchanged {counts['unchanged']}, "
+          f"skipped {counts['skipped']}")
+    return counts
+
 if __name__ == "__main__":
-    convert_rss_to_json_feed("inkhaven_updated.xml", "inkhaven_feed.json")
+    parser = argparse.ArgumentParser(description="Convert the Inkhaven RSS feed to JSON Feed format")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only merge items not already in the JSON feed")
+    parser.add_argument('--stop-at-known', action='store_true',
+                        help="with --incremental, stop at the first already-known item")
+    args = parser.parse_args()
+
+    if args.incremental:
+        ingest_rss_incremental("inkhaven_updated.xml", "inkhaven_feed.json", stop_at_known=args.stop_at_known)
+    else:
+        convert_rss_to_json_feed("inkhaven_updated.xml", "inkhaven_feed.json")
     print("\n✓ Conversion complete! The database now uses inkhaven_updated.xml data.")
 
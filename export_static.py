@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Export every read endpoint as static files, for hosting without a Flask worker.
+
+Renders posts, tags, authors, community tags, author bios, facets, the
+bootstrap payload and the client search index, plus per-tag and per-author
+post shards, into content-hashed files under <out>/data/ with gzip (and,
+if the brotli package is installed, brotli) variants next to each one. A
+copy of index.html is pointed at the hashed files, so the page runs
+unchanged; only adding community tags still goes to the live server given
+by --api.
+
+    python export_static.py --out site --api https://inkhaven-explorer.onrender.com
+
+Re-run it after tagger.py, convert_xml_to_json.py or generate_author_bios.py.
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+from typing import Dict, List
+
+from change_log import ChangeLog
+from http_cache import EncodedPayload, brotli
+from journal import atomic_write_json
+from post_store import PostStore, bootstrap_data
+from search_index import SearchIndex
+from sqlite_store import SQLiteStore, configured_db_path
+
+DATA_DIR = 'data'
+
+# Hashed files never change, so static hosts can cache them forever
+HEADERS_FILE = """/data/*
+  Cache-Control: public, max-age=31536000, immutable
+/index.html
+  Cache-Control: no-cache
+/manifest.json
+  Cache-Control: no-cache
+"""
+
+
+def slugify(value: str) -> str:
+    """A filename-safe form of a tag or author name"""
+    return re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-') or 'x'
+
+
+def set_meta(html: str, name: str, content: str) -> str:
+    """Set the content of <meta name="..."> in index.html"""
+    pattern = re.compile(r'(<meta name="%s" content=")[^"]*(">)' % re.escape(name))
+    if not pattern.search(html):
+        raise ValueError(f'index.html has no <meta name="{name}"> tag')
+    return pattern.sub(lambda m: m.group(1) + content + m.group(2), html)
+
+
+def write_bytes(path: str, data: bytes):
+    """Write a file via a temp file and rename, so hosts never serve a partial file"""
+    fd, tmp_path = tempfile.mkstemp(prefix='.export.', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class StaticExporter:
+    """Writes content-hashed, pre-compressed JSON files and remembers their paths"""
+
+    def __init__(self, out_dir: str, last_modified: float):
+        self.out_dir = out_dir
+        self.last_modified = last_modified
+        self.written: List[str] = []
+        os.makedirs(os.path.join(out_dir, DATA_DIR), exist_ok=True)
+
+    def write(self, name: str, data) -> str:
+        """Write one payload as data/<name>.<hash>.json (+ .gz/.br) and return its path"""
+        payload = EncodedPayload.from_data(data, self.last_modified)
+        rel_path = f'{DATA_DIR}/{name}.{payload.etag[:12]}.json'
+        path = os.path.join(self.out_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        variants = {'': 'identity', '.gz': 'gzip'}
+        if brotli:
+            variants['.br'] = 'br'
+        for suffix, encoding in variants.items():
+            self.written.append(rel_path + suffix)
+            # Names are content hashes, so an existing file is already up to date
+            if not os.path.exists(path + suffix):
+                write_bytes(path + suffix, payload.variant(encoding))
+        return rel_path
+
+    def prune(self) -> int:
+        """Delete data files from earlier exports that nothing refers to any more"""
+        keep = {os.path.normpath(path) for path in self.written}
+        removed = 0
+        data_dir = os.path.join(self.out_dir, DATA_DIR)
+        for root, _, files in os.walk(data_dir):
+            for filename in files:
+                rel_path = os.path.relpath(os.path.join(root, filename), self.out_dir)
+                if os.path.normpath(rel_path) not in keep:
+                    os.remove(os.path.join(root, filename))
+                    removed += 1
+        return removed
+
+
+def shard(posts: List[Dict], positions) -> List[Dict]:
+    return [posts[pos] for pos in sorted(positions)]
+
+
+def export_site(out_dir: str, api_base: str = '', db=None) -> Dict:
+    """Render the current data into out_dir and return the manifest"""
+    # Read the change log first, as the server does, so the data is at least this new
+    change_log_id, change_version = ChangeLog().current()
+    snapshot = PostStore(db=db).snapshot()
+    index = SearchIndex(snapshot.posts, snapshot.version)
+    exporter = StaticExporter(out_dir, snapshot.last_modified)
+
+    files = {
+        'posts': exporter.write('posts', snapshot.posts),
+        'tags': exporter.write('tags', snapshot.tags),
+        'authors': exporter.write('authors', snapshot.authors),
+        'community-tags': exporter.write('community-tags', snapshot.community_tags),
+        'author-bios': exporter.write('author-bios', snapshot.author_bios),
+        'facets': exporter.write('facets', snapshot.facets.counts()),
+        'bootstrap': exporter.write('bootstrap', bootstrap_data(snapshot, change_log_id, change_version)),
+        'search-index': exporter.write('search-index', index.client_index()),
+    }
+    tag_files = {tag: exporter.write(f'tags/{slugify(tag)}', shard(snapshot.posts, index.by_tag[tag]))
+                 for tag in snapshot.tags}
+    author_files = {author: exporter.write(f'authors/{slugify(author)}',
+                                           shard(snapshot.posts, index.by_author[author]))
+                    for author in snapshot.authors}
+
+    manifest = {
+        'version': snapshot.version,
+        'change_version': change_version,
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'api': api_base,
+        'files': files,
+        'tags': tag_files,
+        'authors': author_files,
+    }
+
+    with open('index.html', 'r', encoding='utf-8') as f:
+        html = f.read()
+    html = set_meta(html, 'inkhaven-bootstrap', files['bootstrap'])
+    html = set_meta(html, 'inkhaven-search-index', files['search-index'])
+    html = set_meta(html, 'inkhaven-api', api_base.rstrip('/'))
+    html = set_meta(html, 'inkhaven-static', '1')
+
+    # Pointers last, so they only ever name files that already exist
+    write_bytes(os.path.join(out_dir, '_headers'), HEADERS_FILE.encode('utf-8'))
+    atomic_write_json(os.path.join(out_dir, 'manifest.json'), manifest, indent=2, ensure_ascii=False)
+    write_bytes(os.path.join(out_dir, 'index.html'), html.encode('utf-8'))
+    manifest['pruned'] = exporter.prune()
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the post explorer as static files")
+    parser.add_argument('--out', default='site', help="output directory")
+    parser.add_argument('--api', default='', help="base URL of the live server, for adding community tags")
+    args = parser.parse_args()
+
+    db_path = configured_db_path()
+    manifest = export_site(args.out, args.api, db=SQLiteStore(db_path) if db_path else None)
+    print(f"✓ Exported {len(manifest['files'])} endpoints, {len(manifest['tags'])} tag shards and "
+          f"{len(manifest['authors'])} author shards to {args.out}/ (version {manifest['version']})")
+    if manifest['pruned']:
+        print(f"  Removed {manifest['pruned']} files from earlier exports")
+    if not args.api:
+        print("  No --api given: adding community tags will only work if the site is served by server.py")
@@ -0,0 +1,115 @@
+"""
+Incrementally maintained facet counts for tags, authors and community tags.
+
+Each facet keeps a value -> count map plus a sorted list of the values, both
+updated per post or per tag rather than by rescanning every post, so sorted
+facet lists and their sizes are always ready to serve.
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List
+
+
+class FacetCounts:
+    """Counts for one facet, with its values kept in sorted order"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.counts: Dict[str, int] = {}
+        self._sorted: List[str] = []
+        for value in values:
+            self.add(value)
+
+    def add(self, value: str):
+        count = self.counts.get(value, 0)
+        if count == 0:
+            insort(self._sorted, value)
+        self.counts[value] = count + 1
+
+    def remove(self, value: str):
+        count = self.counts.get(value, 0)
+        if count <= 1:
+            if count:
+                del self.counts[value]
+                del self._sorted[bisect_left(self._sorted, value)]
+            return
+        self.counts[value] = count - 1
+
+    def sorted(self) -> List[str]:
+        """Values in sorted order"""
+        return list(self._sorted)
+
+    def as_dict(self) -> Dict[str, int]:
+        """Counts keyed by value, in sorted order"""
+        return {value: self.counts[value] for value in self._sorted}
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, int]) -> 'FacetCounts':
+        """Rebuild from as_dict() output"""
+        facet = cls()
+        facet.counts = dict(counts)
+        facet._sorted = sorted(counts)
+        return facet
+
+    def copy(self) -> 'FacetCounts':
+        other = FacetCounts()
+        other.counts = dict(self.counts)
+        other._sorted = list(self._sorted)
+        return other
+
+    def __len__(self):
+        return len(self._sorted)
+
+
+class FacetIndex:
+    """Tag, author and community tag counts across a set of posts"""
+
+    def __init__(self):
+        self.tags = FacetCounts()
+        self.authors = FacetCounts()
+        self.community_tags = FacetCounts()
+
+    @classmethod
+    def from_posts(cls, tagged_posts: Dict[str, Dict], community_tags: Dict[str, List[str]] = None) -> 'FacetIndex':
+        index = cls()
+        for post_data in tagged_posts.values():
+            index.add_post(post_data)
+        for tags_list in (community_tags or {}).values():
+            for tag in tags_list:
+                index.community_tags.add(tag)
+        return index
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, Dict[str, int]]) -> 'FacetIndex':
+        """Rebuild from counts() output, e.g. a published /api/facets payload"""
+        index = cls()
+        index.tags = FacetCounts.from_counts(counts['tags'])
+        index.authors = FacetCounts.from_counts(counts['authors'])
+        index.community_tags = FacetCounts.from_counts(counts['community_tags'])
+        return index
+
+    def add_post(self, post_data: Dict):
+        for tag in post_data.get('tags', []):
+            self.tags.add(tag)
+        if post_data.get('author'):
+            self.authors.add(post_data['author'])
+
+    def remove_post(self, post_data: Dict):
+        for tag in post_data.get('tags', []):
+            self.tags.remove(tag)
+        if post_data.get('author'):
+            self.authors.remove(post_data['author'])
+
+    def copy(self) -> 'FacetIndex':
+        other = FacetIndex()
+        other.tags = self.tags.copy()
+        other.authors = self.authors.copy()
+        other.community_tags = self.community_tags.copy()
+        return other
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Facet sizes for the API"""
+        return {
+            'tags': self.tags.as_dict(),
+            'authors': self.authors.as_dict(),
+            'community_tags': self.community_tags.as_dict(),
+        }
@@ -1,17 +1,23 @@
-import json
+import argparse
+import hashlib
 import os
-from anthropic import Anthropic
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 
-def generate_author_bios():
-    """Generate AI bios for each author based on their posts"""
-    
-    # Load tagged posts
-    with open('tagged_posts.json', 'r') as f:
-        tagged_posts = json.load(f)
-    
-    # Group posts by author
+from change_log import BIO, ChangeLog
+from journal import atomic_write_json, load_json_file
+from model_client import MODEL, AdaptiveRateLimiter, call_with_retries, default_client
+from snapshot_file import publishes_from, republish
+from sqlite_store import SQLiteStore, configured_db_path
+
+BIOS_FILE = 'author_bios.json'
+# Hash of the prompt each bio was generated from, so unchanged authors are skipped
+BIO_HASHES_FILE = 'author_bios.hashes.json'
+
+def group_posts_by_author(tagged_posts: Dict) -> Dict[str, List[Dict]]:
+    """Titles and tags of each author's posts"""
     author_posts = defaultdict(list)
     for post_data in tagged_posts.values():
         author = post_data.get('author', '')
@@ -20,75 +26,137 @@ def generate_author_bios():
                 'title': post_data.get('title', ''),
                 'tags': post_data.get('tags', [])
             })
-    
-    # Load or create author bios cache
-    bios_file = 'author_bios.json'
-    if os.path.exists(bios_file):
-        with open(bios_file, 'r') as f:
-            author_bios = json.load(f)
-    else:
-        author_bios = {}
-    
-    # Initialize Anthropic client
-    client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-    
-    print(f"Generating bios for {len(author_posts)} authors...")
-    
-    for i, (author, posts) in enumerate(sorted(author_posts.items()), 1):
-        # Skip if already generated
-        if author in author_bios:
-            print(f"[{i}/{len(author_posts)}] Skipping (cached): {author}")
-            continue
-        
-        print(f"[{i}/{len(author_posts)}] Generating bio for: {author}")
-        
-        # Prepare post information
-        titles = [p['title'] for p in posts[:10]]  # Use up to 10 recent posts
-        all_tags = []
-        for p in posts:
-            all_tags.extend(p['tags'])
-        tag_counts = {}
-        for tag in all_tags:
+    return author_posts
+
+def top_tags(posts: List[Dict]) -> List[Tuple[str, int]]:
+    tag_counts = {}
+    for p in posts:
+        for tag in p['tags']:
             tag_counts[tag] = tag_counts.get(tag, 0) + 1
-        top_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        # Generate bio
-        prompt = f"""Based on these blog post titles and topics, write a brief (2-3 sentence) description of what {author} writes about. Be specific and engaging.
+    return sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+
+def build_prompt(author: str, posts: List[Dict]) -> str:
+    titles = [p['title'] for p in posts[:10]]  # Use up to 10 recent posts
+    return f"""Based on these blog post titles and topics, write a brief (2-3 sentence) description of what {author} writes about. Be specific and engaging.
 
 Recent post titles:
 {chr(10).join(f'- {t}' for t in titles)}
 
-Most common topics: {', '.join(f'{tag} ({count})' for tag, count in top_tags)}
+Most common topics: {', '.join(f'{tag} ({count})' for tag, count in top_tags(posts))}
 
 Write a concise, engaging bio that captures their main themes and style. Start directly with what they write about (don't say "This author writes about..."). Keep it under 60 words."""
 
-        try:
-            message = client.messages.create(
-                model="claude-sonnet-4-5-20250929",
+def fallback_bio(posts: List[Dict]) -> str:
+    return f"Writer exploring various topics including {', '.join(t[0] for t in top_tags(posts)[:3])}."
+
+def prompt_hash(prompt: str) -> str:
+    """Content hash of an author's titles and tags, as they appear in the prompt"""
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+
+def save_bios(db, bios_file: str, hashes_file: str, author_bios: Dict[str, str],
+              bio_hashes: Dict[str, Optional[str]], authors: List[str]):
+    """Persist a batch of new bios and their hashes, then record them for /api/changes"""
+    if not authors:
+        return
+    if db is not None:
+        db.set_author_bios({author: author_bios[author] for author in authors})
+    else:
+        atomic_write_json(bios_file, author_bios, indent=2)
+    atomic_write_json(hashes_file, bio_hashes, indent=2)
+    ChangeLog().record_many(BIO, authors)
+
+def generate_author_bios(db=None, client=None, workers: int = 4, max_rate: float = 2.0,
+                         save_every: int = 10, force: bool = False,
+                         posts_file: str = 'tagged_posts.json', bios_file: str = BIOS_FILE,
+                         hashes_file: str = BIO_HASHES_FILE):
+    """Generate AI bios for each author based on their posts
+
+    Only authors without a bio, or whose titles and tags changed since their
+    bio was written, are sent to the model, `workers` at a time.
+    """
+
+    # Load tagged posts
+    if db is not None:
+        tagged_posts = db.load_tagged_posts()
+        author_bios = db.load_author_bios()
+    else:
+        tagged_posts = load_json_file(posts_file)
+        author_bios = load_json_file(bios_file)
+    author_posts = group_posts_by_author(tagged_posts)
+    prompts = {author: build_prompt(author, posts) for author, posts in author_posts.items()}
+
+    # Bios written before hashes were kept are assumed to match the current posts
+    if os.path.exists(hashes_file):
+        bio_hashes = load_json_file(hashes_file)
+    else:
+        bio_hashes = {author: prompt_hash(prompts[author]) for author in author_bios if author in prompts}
+        if bio_hashes:
+            atomic_write_json(hashes_file, bio_hashes, indent=2)
+            print(f"Adopted {len(bio_hashes)} existing bios; they will be regenerated when their posts change")
+
+    pending = [author for author in sorted(author_posts)
+               if force or author not in author_bios or bio_hashes.get(author) != prompt_hash(prompts[author])]
+    print(f"Generating bios for {len(author_posts)} authors "
+          f"({len(author_posts) - len(pending)} cached, {len(pending)} to generate)...")
+    if not pending:
+        return author_bios
+
+    # Anything with a messages.create() works, e.g. a local fake for tests
+    client = client if client is not None else default_client()
+    limiter = AdaptiveRateLimiter(max_rate=max_rate)
+
+    def generate(author: str) -> str:
+        message = call_with_retries(
+            lambda: client.messages.create(
+                model=MODEL,
                 max_tokens=150,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            bio = message.content[0].text.strip()
-            author_bios[author] = bio
-            
-            # Save after each generation
-            with open(bios_file, 'w') as f:
-                json.dump(author_bios, f, indent=2)
-            
-            print(f"  ✓ Generated: {bio[:60]}...")
-            time.sleep(0.5)  # Rate limiting
-            
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-            author_bios[author] = f"Writer exploring various topics including {', '.join(t[0] for t in top_tags[:3])}."
-            with open(bios_file, 'w') as f:
-                json.dump(author_bios, f, indent=2)
-    
-    print(f"\n✅ Done! Generated bios for {len(author_bios)} authors.")
+                messages=[{"role": "user", "content": prompts[author]}]
+            ),
+            limiter
+        )
+        return message.content[0].text.strip()
+
+    started = time.monotonic()
+    unsaved = []
+    failed = 0
+    # Only this thread touches author_bios and bio_hashes; workers just call the model
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(generate, author): author for author in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            author = futures[future]
+            try:
+                author_bios[author] = future.result()
+                bio_hashes[author] = prompt_hash(prompts[author])
+                print(f"[{i}/{len(pending)}] ✓ {author}: {author_bios[author][:60]}...")
+            except Exception as e:
+                failed += 1
+                print(f"[{i}/{len(pending)}] ✗ {author}: {e}")
+                author_bios[author] = fallback_bio(author_posts[author])
+                # No hash, so the next run tries this author again
+                bio_hashes[author] = None
+            unsaved.append(author)
+
+            # Save in batches rather than after every author
+            if len(unsaved) >= save_every:
+                save_bios(db, bios_file, hashes_file, author_bios, bio_hashes, unsaved)
+                unsaved = []
+
+    save_bios(db, bios_file, hashes_file, author_bios, bio_hashes, unsaved)
+    # Publishing reads the default files; bios written elsewhere don't affect it
+    if db is not None or publishes_from(bios_file):
+        republish(db=db)
+    elapsed = time.monotonic() - started
+    print(f"\n✅ Done! Generated {len(pending) - failed} bios in {elapsed:.1f}s "
+          f"({failed} failed, {limiter.throttled} throttled responses); {len(author_bios)} authors total.")
     return author_bios
 
 if __name__ == "__main__":
-    generate_author_bios()
-
+    parser = argparse.ArgumentParser(description="Generate author bios with Claude")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent model calls")
+    parser.add_argument('--max-rate', type=float, default=2.0, help="maximum requests per second")
+    parser.add_argument('--force', action='store_true', help="regenerate every bio")
+    args = parser.parse_args()
 
+    db_path = configured_db_path()
+    generate_author_bios(db=SQLiteStore(db_path) if db_path else None, workers=args.workers,
+                         max_rate=args.max_rate, force=args.force)
@@ -0,0 +1,167 @@
+"""
+Pre-serialized JSON responses with strong ETags and compressed variants.
+
+A payload is serialized once per snapshot; gzip and brotli bodies are built
+lazily on first request and reused until the underlying data changes.
+
+Large lists can instead be streamed: stream_response() serializes a chunk of
+items at a time as a JSON array or NDJSON (gzipped on the fly if accepted),
+so neither the full body nor its compressed form is ever held in memory.
+
+Payloads published to snapshot.bin (see snapshot_file.py) have memoryview
+bodies over the shared mapping; those are sent in slices with a known length.
+"""
+
+import gzip
+import hashlib
+import json
+import zlib
+from typing import Iterable, Iterator, List
+
+from flask import Response
+from werkzeug.http import http_date
+
+from compact import json_default
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip only
+    brotli = None
+
+
+class EncodedPayload:
+    """A JSON body plus its validators and lazily compressed variants"""
+
+    def __init__(self, body: bytes, last_modified: float):
+        self.body = body
+        self.last_modified = int(last_modified)
+        self.etag = hashlib.sha1(body).hexdigest()
+        self._variants = {'identity': body}
+
+    @classmethod
+    def from_data(cls, data, last_modified: float) -> 'EncodedPayload':
+        with metrics.phase('serialize'):
+            body = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+        return cls(body, last_modified)
+
+    def encodings(self):
+        """Content codings we can produce, best first"""
+        return ['br', 'gzip', 'identity'] if brotli else ['gzip', 'identity']
+
+    def variant(self, encoding: str) -> bytes:
+        """Return the body in the given content coding, compressing on first use"""
+        body = self._variants.get(encoding)
+        if encoding != 'identity':
+            metrics.cache('compressed', body is not None)
+        if body is None:
+            with metrics.phase(f'compress_{encoding}'):
+                if encoding == 'br':
+                    body = brotli.compress(self.body)
+                else:
+                    body = gzip.compress(self.body, compresslevel=6, mtime=0)
+            self._variants[encoding] = body
+        return body
+
+
+# Items serialized per chunk of a streamed response
+STREAM_CHUNK = 200
+# Bytes per slice of a memory-mapped body; WSGI servers only accept bytes chunks
+VIEW_CHUNK = 256 * 1024
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def coded_etag(etag: str, encoding: str) -> str:
+    """A strong ETag must differ per representation, so compressed bodies get their coding appended"""
+    return etag if encoding == 'identity' else f'{etag}-{encoding}'
+
+
+def not_modified(etag: str, last_modified: int, request, encodings=()) -> bool:
+    """Check the request's conditional headers against a response's validators
+
+    A client may hold the body in any of `encodings`, so its tag for any of
+    them is a match.
+    """
+    if request.if_none_match:
+        return (request.if_none_match.star_tag or request.if_none_match.contains(etag)
+                or any(request.if_none_match.contains(coded_etag(etag, encoding)) for encoding in encodings))
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since.timestamp()
+    return False
+
+
+def payload_response(payload: EncodedPayload, request, cache_control: str = 'no-cache') -> Response:
+    """Build a Flask response for the payload, honouring conditional requests"""
+    encoding = request.accept_encodings.best_match(payload.encodings(), default='identity')
+    headers = {
+        'ETag': f'"{coded_etag(payload.etag, encoding)}"',
+        'Last-Modified': http_date(payload.last_modified),
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+    if not_modified(payload.etag, payload.last_modified, request, payload.encodings()):
+        return Response(status=304, headers=headers)
+
+    body = payload.variant(encoding)
+    if isinstance(body, memoryview):
+        headers['Content-Length'] = str(len(body))
+        body = view_chunks(body)
+    response = Response(body, mimetype='application/json', headers=headers)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def view_chunks(view: memoryview, chunk_size: int = VIEW_CHUNK) -> Iterator[bytes]:
+    """Copy a memoryview out one slice at a time"""
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+def json_chunks(items: List, ndjson: bool = False, chunk_size: int = STREAM_CHUNK) -> Iterator[bytes]:
+    """Serialize items as one JSON array, or one JSON document per line, in chunks"""
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default).encode
+    if not ndjson:
+        yield b'['
+    for start in range(0, len(items), chunk_size):
+        parts = [encode(item) for item in items[start:start + chunk_size]]
+        if ndjson:
+            text = '\n'.join(parts) + '\n'
+        else:
+            text = (',' if start else '') + ','.join(parts)
+        yield text.encode('utf-8')
+    if not ndjson:
+        yield b']'
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Gzip a stream, flushing after every chunk so clients can decode as it arrives"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_response(chunks: Iterable[bytes], version: str, last_modified: float, request,
+                    ndjson: bool = False) -> Response:
+    """Stream a JSON or NDJSON body (e.g. from json_chunks), validated by the data version instead of a body hash"""
+    last_modified = int(last_modified)
+    etag = f'{version}-{"ndjson" if ndjson else "json"}'
+    # Only gzip can be flushed chunk by chunk with the standard library
+    encoding = request.accept_encodings.best_match(['gzip', 'identity'], default='identity')
+    headers = {
+        'ETag': f'"{coded_etag(etag, encoding)}"',
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept, Accept-Encoding',
+    }
+    if not_modified(etag, last_modified, request, ['gzip']):
+        return Response(status=304, headers=headers)
+
+    if encoding == 'gzip':
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, mimetype=NDJSON_MIMETYPE if ndjson else 'application/json', headers=headers)
@@ -0,0 +1,139 @@
+"""
+Append-only JSONL journals and atomic JSON snapshot writes.
+
+Writers append one JSON object per line instead of rewriting a whole file,
+and periodically compact the journal into a snapshot that is written to a
+temporary file and renamed into place, so readers never see a torn file.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to an in-process lock only
+    fcntl = None
+
+_local_locks: Dict[str, threading.Lock] = {}
+
+
+def load_json_file(path: str, default=None):
+    """Load a JSON file, returning `default` if it does not exist"""
+    if not os.path.exists(path):
+        return {} if default is None else default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def atomic_write_json(path: str, data, **dump_kwargs):
+    """Write JSON to a temp file in the same directory, then rename it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive lock on path across threads and processes"""
+    local = _local_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with local:
+        if fcntl is None:
+            yield
+            return
+        with open(path, 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def journal_path_for(path: str) -> str:
+    """tagged_posts.json -> tagged_posts.journal.jsonl"""
+    return os.path.splitext(path)[0] + '.journal.jsonl'
+
+
+class JsonJournal:
+    """An append-only file of JSON records, one per line"""
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+
+    def append(self, record: Dict):
+        """Append a record; a single write keeps concurrent appenders from interleaving"""
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.path, 'a+b') as f:
+            # End a torn line left by a crash, or it would swallow this record on replay
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = b'\n' + line
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def replay(self) -> Iterator[Dict]:
+        """Yield every complete record, skipping a torn final line from a crash"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def read_from(self, offset: int) -> Tuple[Optional[List[Dict]], int]:
+        """Complete records appended after byte `offset`, and the offset to resume from
+
+        Returns (None, 0) if the journal is now shorter than `offset`, i.e. it was
+        cleared or replaced and must be replayed from the start.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < offset:
+                    return None, 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return (None, 0) if offset else ([], 0)
+
+        # Leave a torn final line for the next read
+        end = data.rfind(b'\n') + 1
+        records = []
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return records, offset + end
+
+    def size(self) -> int:
+        """Size of the journal in bytes (0 if it does not exist)"""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def clear(self):
+        """Drop all records once they have been compacted into a snapshot"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,252 @@
+"""
+Opt-in request timing and hot-path instrumentation for server.py.
+
+Set INKHAVEN_METRICS=1 to record, per worker process:
+
+- request latency and response size per route, method and status
+- time spent in each phase of the read path (file reads, JSON parsing,
+  merging and sorting the snapshot, serialization, compression), per route
+- hits and misses of the snapshot, payload and compression caches
+
+into in-process histograms and counters, served at /metrics in the
+Prometheus text format. With instrumentation off, every hook is a no-op.
+
+Set INKHAVEN_PROFILE_SLOW_MS as well to profile a sample of requests with
+cProfile and write the profile of any that take longer than that to
+INKHAVEN_PROFILE_DIR (default: profiles/), for `python -m pstats` or snakeviz:
+
+    INKHAVEN_METRICS=1 INKHAVEN_PROFILE_SLOW_MS=200 INKHAVEN_PROFILE_SAMPLE=0.05 gunicorn server:app
+"""
+
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+# Seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+NO_OP = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label tuple"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket (non-cumulative)..., +Inf count, sum]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.series.items()):
+            pairs = list(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{format_labels(pairs + [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(pairs)} {series[-1]!r}')
+            lines.append(f'{self.name}_count{format_labels(pairs)} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per label tuple"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series: Dict[Tuple[str, ...], int] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: int = 1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{format_labels(list(zip(self.label_names, labels)))} {value}')
+        return lines
+
+
+def format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    escaped = (re.sub(r'(["\\])', r'\\\1', str(value)).replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class SlowRequestProfiler:
+    """Profiles a sample of requests and keeps the profiles of slow ones
+
+    cProfile traces every call, so only a fraction of requests are profiled,
+    and only one at a time since the interpreter allows a single profiler.
+    """
+
+    def __init__(self, slow_seconds: float, sample_rate: float, out_dir: str):
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.out_dir = out_dir
+        self._busy = threading.Lock()
+        self.dumped = 0
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler (e.g. a debugger) is active
+            self._busy.release()
+            return None
+        return profiler
+
+    def finish(self, profiler: cProfile.Profile, route: str, seconds: float):
+        try:
+            profiler.disable()
+            if seconds >= self.slow_seconds:
+                os.makedirs(self.out_dir, exist_ok=True)
+                slug = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+                name = f'{slug}-{int(seconds * 1000)}ms-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof'
+                profiler.dump_stats(os.path.join(self.out_dir, name))
+                self.dumped += 1
+        finally:
+            self._busy.release()
+
+
+class Metrics:
+    """Process-wide registry; every method is a no-op unless enabled"""
+
+    def __init__(self, enabled: bool = False, profiler: Optional[SlowRequestProfiler] = None):
+        self.enabled = enabled
+        self.profiler = profiler
+        self._lock = threading.Lock()
+        # Route of the request being handled by this thread
+        self._local = threading.local()
+        self.requests = Histogram('inkhaven_request_seconds', 'Request latency',
+                                  ('route', 'method', 'status'), LATENCY_BUCKETS)
+        self.sizes = Histogram('inkhaven_response_bytes', 'Response body size as sent (after compression)',
+                               ('route',), SIZE_BUCKETS)
+        self.phases = Histogram('inkhaven_phase_seconds', 'Time spent in each phase of the read path',
+                                ('route', 'phase'), LATENCY_BUCKETS)
+        self.caches = Counter('inkhaven_cache_total', 'Cache lookups by cache and result',
+                              ('cache', 'result'))
+
+    def phase(self, name: str):
+        """Context manager timing one phase of the current request"""
+        if not self.enabled:
+            return NO_OP
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.phases.observe((self.current_route(), name), elapsed)
+
+    def cache(self, name: str, hit: bool):
+        """Count one lookup of a named cache"""
+        if self.enabled:
+            with self._lock:
+                self.caches.inc((name, 'hit' if hit else 'miss'))
+
+    def current_route(self) -> str:
+        return getattr(self._local, 'route', None) or 'background'
+
+    def install(self, app):
+        """Add the request hooks and the /metrics route to a Flask app"""
+        if not self.enabled:
+            return
+        from flask import Response, g, request
+
+        @app.before_request
+        def start_timer():
+            self._local.route = request.url_rule.rule if request.url_rule else 'unmatched'
+            g.metrics_started = time.perf_counter()
+            g.metrics_profiler = self.profiler.start() if self.profiler else None
+
+        @app.after_request
+        def record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is None:
+                return response
+            elapsed = time.perf_counter() - started
+            route = self.current_route()
+            profiler = g.pop('metrics_profiler', None)
+            if profiler is not None:
+                self.profiler.finish(profiler, route, elapsed)
+            with self._lock:
+                self.requests.observe((route, request.method, str(response.status_code)), elapsed)
+                # Streamed bodies have no length up front
+                if response.content_length is not None:
+                    self.sizes.observe((route,), response.content_length)
+            return response
+
+        @app.teardown_request
+        def reset_request(exc):
+            # after_request is skipped when a view raises; release the profiler anyway
+            profiler = g.pop('metrics_profiler', None)
+            if profiler is not None:
+                self.profiler.finish(profiler, self.current_route(), 0.0)
+            self._local.route = None
+
+        @app.route('/metrics')
+        def get_metrics():
+            """Request, phase and cache metrics for this worker, in Prometheus text format"""
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.sizes, self.phases, self.caches):
+                lines.extend(metric.render())
+        # Each worker keeps its own numbers; the pid tells scrapes of different workers apart
+        lines.append('# HELP inkhaven_worker_pid Process id of the worker that answered')
+        lines.append('# TYPE inkhaven_worker_pid gauge')
+        lines.append(f'inkhaven_worker_pid {os.getpid()}')
+        if self.profiler:
+            lines.append('# HELP inkhaven_slow_profiles_total Profiles written for slow requests')
+            lines.append('# TYPE inkhaven_slow_profiles_total counter')
+            lines.append(f'inkhaven_slow_profiles_total {self.profiler.dumped}')
+        return '\n'.join(lines) + '\n'
+
+
+def configured_metrics() -> Metrics:
+    """Metrics enabled by INKHAVEN_METRICS, with the slow-request profiler if configured"""
+    if os.environ.get('INKHAVEN_METRICS', '') in ('', '0'):
+        return Metrics()
+    profiler = None
+    slow_ms = os.environ.get('INKHAVEN_PROFILE_SLOW_MS')
+    if slow_ms:
+        profiler = SlowRequestProfiler(
+            slow_seconds=float(slow_ms) / 1000,
+            sample_rate=float(os.environ.get('INKHAVEN_PROFILE_SAMPLE', '0.1')),
+            out_dir=os.environ.get('INKHAVEN_PROFILE_DIR', 'profiles')
+        )
+    return Metrics(enabled=True, profiler=profiler)
+
+
+# Shared by the server and the modules on its read path
+metrics = configured_metrics()
@@ -0,0 +1,103 @@
+"""
+Shared helpers for calling the Anthropic API from the batch scripts.
+
+Provides the default client, an adaptive rate limiter that backs off on
+429/overloaded responses, and a retry wrapper with exponential backoff.
+Any object with a compatible `messages.create()` can stand in for the real
+client, which keeps the scripts testable against a local fake.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+MODEL = "claude-sonnet-4-5-20250929"
+
+# Status codes worth retrying: rate limited, overloaded, transient server errors
+THROTTLE_STATUSES = {429, 529}
+RETRYABLE_STATUSES = THROTTLE_STATUSES | {408, 409, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {'APIConnectionError', 'APITimeoutError', 'ConnectionError', 'TimeoutError'}
+
+
+def default_client():
+    """Create the Anthropic client; retries are handled by call_with_retries"""
+    from anthropic import Anthropic
+    return Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"), max_retries=0)
+
+
+def _status(error) -> Optional[int]:
+    return getattr(error, 'status_code', None)
+
+
+def is_throttled(error) -> bool:
+    """True for rate-limit and overload responses"""
+    return _status(error) in THROTTLE_STATUSES
+
+
+def is_retryable(error) -> bool:
+    """True for errors that may succeed if the request is repeated"""
+    return _status(error) in RETRYABLE_STATUSES or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error) -> Optional[float]:
+    """Seconds the server asked us to wait, if it sent a retry-after header"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """Spaces out request starts, slowing down when throttled and recovering on success"""
+
+    def __init__(self, max_rate: float = 2.0, max_interval: float = 30.0):
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.max_interval = max_interval
+        self.interval = self.min_interval
+        self.throttled = 0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may start its next request"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_success(self):
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * 0.9)
+
+    def on_throttle(self, wait: Optional[float] = None):
+        with self._lock:
+            self.throttled += 1
+            self.interval = min(self.max_interval, max(self.interval * 2, 0.1))
+            pause = wait if wait is not None else self.interval
+            self._next_slot = max(self._next_slot, time.monotonic() + pause)
+
+
+def call_with_retries(fn: Callable, limiter: AdaptiveRateLimiter,
+                      max_retries: int = 5, base_delay: float = 1.0):
+    """Call fn() under the rate limiter, retrying transient failures with backoff"""
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            result = fn()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            wait = retry_after(e)
+            if is_throttled(e):
+                limiter.on_throttle(wait)
+            delay = wait if wait is not None else base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+            time.sleep(min(delay, 60.0))
+        else:
+            limiter.on_success()
+            return result
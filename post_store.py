@@ -0,0 +1,320 @@
+"""
+In-memory post store shared by the Flask read endpoints.
+
+The store parses tagged_posts.json, community_tags.json and author_bios.json
+once (plus the append-only journals), keeps the merged, date-sorted post
+list (as compact Post records, see compact.py) and the derived tag/author
+facets in memory, and only reloads when the
+backing files' mtime or size change. New community tags appended to the
+journal (or to the SQLite community_tags table) are folded into the current
+snapshot without a full rebuild.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from community_log import COMMUNITY_TAGS_FILE, fold_events
+from compact import Post, as_post, load_posts
+from facets import FacetIndex
+from journal import JsonJournal, journal_path_for
+from metrics import metrics
+
+TAGGED_POSTS_FILE = 'tagged_posts.json'
+AUTHOR_BIOS_FILE = 'author_bios.json'
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Return (mtime_ns, size) for a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def read_json(path: str, name: str) -> Dict:
+    """Load a JSON file ({} if missing), timing the read and the parse separately"""
+    with metrics.phase(f'read_{name}'):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}
+    with metrics.phase(f'parse_{name}'):
+        return json.loads(data)
+
+
+def signature_version(signature: Tuple) -> str:
+    """Short version string for a source signature"""
+    return hashlib.sha1(repr(signature).encode()).hexdigest()[:16]
+
+
+def signature_last_modified(signature: Tuple) -> float:
+    """Newest mtime in a source signature, in seconds"""
+    return max((sig[0] / 1e9 for sig in signature if sig is not None), default=0.0)
+
+
+class Snapshot:
+    """Immutable, fully derived view of the post data at one point in time"""
+
+    def __init__(self, tagged_posts: Dict, community_tags: Dict, author_bios: Dict, signature: Tuple):
+        with metrics.phase('merge'):
+            # Plain records (e.g. from SQLite) become compact posts once
+            tagged_posts = {post_id: as_post(post_id, post_data) for post_id, post_data in tagged_posts.items()}
+            posts = []
+            for post_id, post in tagged_posts.items():
+                # Posts without community tags are shared with tagged_posts
+                tags_list = community_tags.get(post_id)
+                posts.append(post.with_community_tags(tags_list) if tags_list else post)
+        self._set_sources(tagged_posts, community_tags, author_bios, signature)
+
+        with metrics.phase('sort'):
+            # Sort by date (newest first), on the dates parsed at load
+            posts.sort(key=lambda post: post.timestamp, reverse=True)
+            positions = {post.id: i for i, post in enumerate(posts)}
+
+        with metrics.phase('facets'):
+            facets = FacetIndex.from_posts(tagged_posts, community_tags)
+        self._set_derived(posts, positions, facets)
+
+    def _set_sources(self, tagged_posts: Dict, community_tags: Dict, author_bios: Dict, signature: Tuple):
+        self.tagged_posts = tagged_posts
+        self.community_map = community_tags
+        self.author_bios = author_bios
+        self.signature = signature
+        self.version = signature_version(signature)
+        self.last_modified = signature_last_modified(signature)
+        self._memo = {}
+        # Reentrant: a memoized value may be built from other memoized values
+        self._memo_lock = threading.RLock()
+
+    def _set_derived(self, posts: List[Post], positions: Dict[str, int], facets: FacetIndex):
+        self.posts: List[Post] = posts
+        # Post id -> index into posts
+        self.positions = positions
+        self.facets = facets
+        self.tags: List[str] = facets.tags.sorted()
+        self.authors: List[str] = facets.authors.sorted()
+        self.community_tags: List[str] = facets.community_tags.sorted()
+
+    def with_community_events(self, events: List[Dict], signature: Tuple) -> 'Snapshot':
+        """A new snapshot with appended community tag events applied
+
+        Only the posts that gained a tag are copied; the post order, positions
+        and unchanged post dicts are shared with this snapshot.
+        """
+        community_map = dict(self.community_map)
+        facets = self.facets.copy()
+        posts = self.posts
+        for event in events:
+            post_id, tag = event['post_id'], event['tag']
+            existing = community_map.get(post_id, [])
+            if tag in existing:
+                continue
+            tags_list = existing + [tag]
+            community_map[post_id] = tags_list
+            facets.community_tags.add(tag)
+            position = self.positions.get(post_id)
+            if position is not None:
+                if posts is self.posts:
+                    posts = list(self.posts)
+                posts[position] = posts[position].with_community_tags(tags_list)
+
+        snapshot = Snapshot.__new__(Snapshot)
+        snapshot._set_sources(self.tagged_posts, community_map, self.author_bios, signature)
+        snapshot._set_derived(posts, self.positions, facets)
+        return snapshot
+
+    def memo(self, key, factory):
+        """Compute a value derived from this snapshot once and keep it"""
+        cache = key[0] if isinstance(key, tuple) else key
+        try:
+            value = self._memo[key]
+        except KeyError:
+            pass
+        else:
+            metrics.cache(cache, True)
+            return value
+        with self._memo_lock:
+            if key not in self._memo:
+                metrics.cache(cache, False)
+                self._memo[key] = factory()
+            return self._memo[key]
+
+
+def bootstrap_data(snapshot, change_log_id: str, change_version: int) -> Dict:
+    """Everything the page needs on load; also written out by export_static.py and snapshot_file.py"""
+    return {
+        'version': snapshot.version,
+        'change_log': change_log_id,
+        'change_version': change_version,
+        'posts': snapshot.posts,
+        'tags': snapshot.tags,
+        'authors': snapshot.authors,
+        'community_tags': snapshot.community_tags,
+        'author_bios': snapshot.author_bios,
+    }
+
+
+def bootstrap_memo_key(change_log_id: str, change_version: int) -> Tuple:
+    """Snapshot memo key for the bootstrap payload, which also depends on the change log"""
+    return ('payload', 'bootstrap', change_log_id, change_version)
+
+
+class PostStore:
+    """Process-wide cache of the post data, reloaded when the files change"""
+
+    def __init__(self, posts_file: str = TAGGED_POSTS_FILE,
+                 community_file: str = COMMUNITY_TAGS_FILE,
+                 bios_file: str = AUTHOR_BIOS_FILE, db=None):
+        # Optional SQLiteStore; when set it replaces the JSON files and journals
+        self.db = db
+        self.posts_file = posts_file
+        self.community_file = community_file
+        self.bios_file = bios_file
+        # Tags written by a running tagger that have not been compacted yet
+        self.posts_journal = JsonJournal(journal_path_for(posts_file))
+        # Community tags appended by the server since the last compaction
+        self.community_journal = JsonJournal(journal_path_for(community_file))
+        self._base_posts: Optional[Dict] = None
+        self._base_community: Optional[Dict] = None
+        # Bytes of the community journal already folded into the snapshot
+        self._community_offset = 0
+        # SQLiteStore.data_versions() as of the current snapshot
+        self._db_versions: Optional[Tuple] = None
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+        self.hits = 0
+        self.reloads = 0
+        self.incremental = 0
+
+    def _signature(self) -> Tuple:
+        if self.db is not None:
+            return self.db.signature()
+        return (file_signature(self.posts_file), file_signature(self.posts_journal.path),
+                file_signature(self.community_file), file_signature(self.community_journal.path),
+                file_signature(self.bios_file))
+
+    def _load_posts(self, current: Optional[Snapshot], signature: Tuple) -> Dict:
+        if current is not None and current.signature[0:2] == signature[0:2]:
+            return current.tagged_posts
+        if self._base_posts is None or current is None or current.signature[0] != signature[0]:
+            raw = read_json(self.posts_file, 'posts')
+            with metrics.phase('convert_posts'):
+                self._base_posts = load_posts(raw)
+            del raw
+
+        with metrics.phase('replay_posts_journal'):
+            journaled = list(self.posts_journal.replay())
+        if not journaled:
+            return self._base_posts
+        tagged_posts = dict(self._base_posts)
+        for entry in journaled:
+            post_id = entry.pop('id')
+            tagged_posts[post_id] = Post.from_record(post_id, entry)
+        return tagged_posts
+
+    def _load_community(self, current: Optional[Snapshot], signature: Tuple) -> Dict:
+        if current is not None and current.signature[2:4] == signature[2:4]:
+            return current.community_map
+        if self._base_community is None or current is None or current.signature[2] != signature[2]:
+            self._base_community = read_json(self.community_file, 'community')
+
+        with metrics.phase('replay_community_journal'):
+            community_tags = {post_id: list(tags) for post_id, tags in self._base_community.items()}
+            events, self._community_offset = self.community_journal.read_from(0)
+            return fold_events(community_tags, events or [])
+
+    def _apply_community_tail(self, current: Optional[Snapshot], signature: Tuple) -> Optional[Snapshot]:
+        """Fold newly appended community tags into the current snapshot, if that is all that changed"""
+        if current is None or current.signature[:3] != signature[:3] or current.signature[4] != signature[4]:
+            return None
+        with metrics.phase('community_tail'):
+            events, offset = self.community_journal.read_from(self._community_offset)
+            if events is None:
+                return None
+            self._community_offset = offset
+            self.incremental += 1
+            return current.with_community_events(events, signature)
+
+    def _apply_db_community_tail(self, current: Optional[Snapshot], versions: Tuple,
+                                 signature: Tuple) -> Optional[Snapshot]:
+        """Like _apply_community_tail, for community tags added to the database"""
+        if current is None or self._db_versions is None or self._db_versions[:3] != versions[:3]:
+            return None
+        with metrics.phase('community_tail'):
+            events = self.db.community_tags_between(self._db_versions[3], versions[3])
+            self.incremental += 1
+            return current.with_community_events(events, signature)
+
+    def _load_bios(self, current: Optional[Snapshot], signature: Tuple) -> Dict:
+        if current is not None and current.signature[4] == signature[4]:
+            return current.author_bios
+        return read_json(self.bios_file, 'bios')
+
+    def snapshot(self) -> Snapshot:
+        """Return the current snapshot, reloading it if the files changed"""
+        with metrics.phase('stat'):
+            signature = self._signature()
+        current = self._snapshot
+        if current is not None and current.signature == signature:
+            self.hits += 1
+            metrics.cache('snapshot', True)
+            return current
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            current = self._snapshot
+            if current is not None and current.signature == signature:
+                self.hits += 1
+                metrics.cache('snapshot', True)
+                return current
+
+            metrics.cache('snapshot', False)
+            if self.db is not None:
+                # Read before the data, so rows written meanwhile are picked up next time
+                versions = self.db.data_versions()
+                snapshot = self._apply_db_community_tail(current, versions, signature)
+                if snapshot is None:
+                    with metrics.phase('read_db'):
+                        sources = (self.db.load_tagged_posts(), self.db.load_community_tags(),
+                                   self.db.load_author_bios())
+                    snapshot = Snapshot(*sources, signature)
+                self._db_versions = versions
+            else:
+                # A community tag append only touches the posts it tags
+                snapshot = self._apply_community_tail(current, signature)
+                if snapshot is None:
+                    # Only re-read the sources that actually changed
+                    snapshot = Snapshot(
+                        self._load_posts(current, signature),
+                        self._load_community(current, signature),
+                        self._load_bios(current, signature),
+                        signature
+                    )
+            self._snapshot = snapshot
+            self.reloads += 1
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next snapshot() call to reload from disk"""
+        with self._lock:
+            self._snapshot = None
+            self._base_posts = None
+            self._base_community = None
+            self._community_offset = 0
+            self._db_versions = None
+
+    def stats(self) -> Dict:
+        """Counters for confirming the cache is effective"""
+        snapshot = self._snapshot
+        return {
+            'pid': os.getpid(),
+            'hits': self.hits,
+            'reloads': self.reloads,
+            'incremental': self.incremental,
+            'posts': len(snapshot.posts) if snapshot else 0,
+        }
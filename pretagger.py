@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Local naive Bayes pre-tagger, trained on the tags already cached from the model.
+
+Each post is reduced to its lowercased title words plus its domain, and one
+multinomial naive Bayes model per tag decides whether the post has that tag.
+When every per-tag decision is confident (probability above the threshold or
+below one minus it) and at least one tag is assigned, the tagger uses the
+prediction instead of calling the model; otherwise the post goes to the model.
+
+Run it directly to see how often its confident predictions agree with the
+cached labels under cross-validation, for a range of thresholds:
+
+    python pretagger.py --folds 5
+"""
+
+import argparse
+import hashlib
+import json
+import math
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from search_index import title_tokens
+
+DEFAULT_THRESHOLD = 0.9
+# Maximum number of tags the model is asked for, so never predict more
+MAX_TAGS = 4
+
+
+def post_features(title: str, url: str) -> List[str]:
+    """Title words plus a domain feature"""
+    features = title_tokens(title)
+    host = (urlparse(url).hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if host:
+        features.append(f'domain:{host}')
+    return features
+
+
+class PreTagger:
+    """One-vs-rest multinomial naive Bayes over title words and domain"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, alpha: float = 0.1, min_posts: int = 50):
+        self.threshold = threshold
+        # Additive smoothing; small values did best against the cached tags
+        self.alpha = alpha
+        # Below this many training posts the pre-tagger never predicts
+        self.min_posts = min_posts
+        self.posts = 0
+        self.tag_posts: Counter = Counter()
+        self.with_tag: Dict[str, Counter] = defaultdict(Counter)
+        self.with_tag_total: Counter = Counter()
+        self.all_features: Counter = Counter()
+        self.all_total = 0
+
+    def fit(self, tagged_posts: Dict[str, Dict]) -> 'PreTagger':
+        """Count features per tag from cached {post_id: {title, url, tags}} records"""
+        for post_data in tagged_posts.values():
+            self._add(post_features(post_data.get('title', ''), post_data.get('url', '')),
+                      post_data.get('tags', []))
+        return self
+
+    def _add(self, features: List[str], tags: Iterable[str]):
+        self.posts += 1
+        self.all_features.update(features)
+        self.all_total += len(features)
+        for tag in set(tags):
+            self.tag_posts[tag] += 1
+            self.with_tag[tag].update(features)
+            self.with_tag_total[tag] += len(features)
+
+    def probabilities(self, title: str, url: str) -> Dict[str, float]:
+        """P(tag | post) for every tag seen in training"""
+        features = post_features(title, url)
+        vocabulary = len(self.all_features) + 1
+        probabilities = {}
+        for tag, count in self.tag_posts.items():
+            with_tag = self.with_tag[tag]
+            positive_total = self.with_tag_total[tag] + self.alpha * vocabulary
+            negative_total = self.all_total - self.with_tag_total[tag] + self.alpha * vocabulary
+            # Log odds of the tag, starting from its prior
+            logit = math.log((count + self.alpha) / (self.posts - count + self.alpha))
+            for feature in features:
+                positive = with_tag[feature]
+                negative = self.all_features[feature] - positive
+                logit += math.log((positive + self.alpha) / positive_total)
+                logit -= math.log((negative + self.alpha) / negative_total)
+            probabilities[tag] = 1.0 / (1.0 + math.exp(-max(min(logit, 50.0), -50.0)))
+        return probabilities
+
+    @staticmethod
+    def decide(probabilities: Dict[str, float], threshold: float) -> Optional[List[str]]:
+        """Tags to assign, or None unless every per-tag decision clears the threshold"""
+        tags = []
+        for tag, p in probabilities.items():
+            if p >= threshold:
+                tags.append(tag)
+            elif p > 1.0 - threshold:
+                return None
+        if not tags or len(tags) > MAX_TAGS:
+            return None
+        return sorted(tags, key=lambda tag: probabilities[tag], reverse=True)
+
+    def predict(self, title: str, url: str) -> Optional[List[str]]:
+        """Confident tags for a post, or None to ask the model"""
+        if self.posts < self.min_posts:
+            return None
+        return self.decide(self.probabilities(title, url), self.threshold)
+
+    @classmethod
+    def evaluate(cls, tagged_posts: Dict[str, Dict], folds: int = 5,
+                 thresholds: Iterable[float] = (0.8, 0.9, 0.95, 0.99), **kwargs) -> List[Dict]:
+        """Cross-validated coverage and agreement with the cached labels per threshold
+
+        Coverage is the share of posts the pre-tagger would tag itself; exact
+        agreement is the share of those where its tags equal the cached ones,
+        and jaccard the mean overlap of the two tag sets.
+        """
+        def fold_of(post_id: str) -> int:
+            return int(hashlib.sha1(post_id.encode('utf-8')).hexdigest(), 16) % folds
+
+        held_out = []
+        for fold in range(folds):
+            train = {post_id: data for post_id, data in tagged_posts.items() if fold_of(post_id) != fold}
+            model = cls(**kwargs).fit(train)
+            for post_id, data in tagged_posts.items():
+                if fold_of(post_id) == fold:
+                    held_out.append((set(data.get('tags', [])),
+                                     model.probabilities(data.get('title', ''), data.get('url', ''))))
+
+        results = []
+        for threshold in thresholds:
+            covered = exact = 0
+            jaccard = 0.0
+            for actual, probabilities in held_out:
+                predicted = cls.decide(probabilities, threshold)
+                if predicted is None:
+                    continue
+                covered += 1
+                predicted = set(predicted)
+                exact += predicted == actual
+                jaccard += len(predicted & actual) / len(predicted | actual)
+            results.append({
+                'threshold': threshold,
+                'posts': len(held_out),
+                'coverage': covered / len(held_out) if held_out else 0.0,
+                'exact_agreement': exact / covered if covered else 0.0,
+                'jaccard': jaccard / covered if covered else 0.0,
+            })
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validate the pre-tagger against cached tags")
+    parser.add_argument('--cache-file', default='tagged_posts.json')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.8, 0.9, 0.95, 0.99])
+    args = parser.parse_args()
+
+    with open(args.cache_file, 'r') as f:
+        tagged_posts = json.load(f)
+
+    print(f"Cross-validating on {len(tagged_posts)} cached posts ({args.folds} folds)...")
+    print(f"{'threshold':>10} {'coverage':>9} {'exact':>7} {'jaccard':>8}")
+    for row in PreTagger.evaluate(tagged_posts, folds=args.folds, thresholds=args.thresholds):
+        print(f"{row['threshold']:>10.2f} {row['coverage']:>8.1%} {row['exact_agreement']:>6.1%} "
+              f"{row['jaccard']:>7.1%}")
@@ -0,0 +1,214 @@
+"""
+Inverted indexes over a post snapshot for server-side filtering.
+
+Posts are addressed by their position in the snapshot's date-ordered list, so
+any sorted list of positions is already newest-first. Facet filters follow
+the frontend's semantics: OR within a facet, AND across facets, and every
+query word must be the start of a word in the title (a query with no words,
+e.g. only punctuation, is matched as a substring instead). Posting lists are
+sorted int arrays, a fraction of the size of sets of ints.
+
+SearchIndex.client_index() packs the same facet indexes, plus title token
+posting lists, into a compact JSON form the browser can filter with by
+bitset intersection and prefix lookup.
+"""
+
+import base64
+import binascii
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from compact import Post, tag_mask
+
+EMPTY = array('i')
+# Check candidate titles directly once they are this many times fewer than a word's postings
+VERIFY_RATIO = 8
+
+
+def new_posting() -> array:
+    return array('i')
+
+
+# Title words; the frontend splits queries the same way
+TOKEN = re.compile(r'\w+')
+
+
+def title_tokens(title: str) -> List[str]:
+    """Lowercased words of a title"""
+    return TOKEN.findall(title.lower())
+
+
+def encode_positions(positions: List[int], size: int) -> Union[List[int], str]:
+    """Sorted positions as a list, or as a base64 bitset when that is smaller
+
+    Bit i of the bitset is bit (i % 8) of byte (i // 8).
+    """
+    bitset_bytes = (size + 7) // 8
+    if len(positions) * (len(str(size)) + 1) <= bitset_bytes * 4 // 3:
+        return positions
+    bits = bytearray(bitset_bytes)
+    for pos in positions:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return base64.b64encode(bytes(bits)).decode()
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor is malformed or belongs to another data version"""
+
+
+class SearchIndex:
+    """Tag, author, community tag and title word indexes for one snapshot"""
+
+    def __init__(self, posts: List[Post], version: str = ''):
+        self.posts = posts
+        self.version = version
+        self.titles = []
+        # Positions are visited in order, so every posting array comes out sorted
+        self.by_tag = defaultdict(new_posting)
+        self.by_author = defaultdict(new_posting)
+        self.by_community_tag = defaultdict(new_posting)
+        self.by_token = defaultdict(new_posting)
+
+        for pos, post in enumerate(posts):
+            title = post.get('title', '').lower()
+            self.titles.append(title)
+            for tag in dict.fromkeys(post.get('tags', [])):
+                self.by_tag[tag].append(pos)
+            for tag in dict.fromkeys(post.get('community_tags', [])):
+                self.by_community_tag[tag].append(pos)
+            author = post.get('author', '')
+            if author:
+                self.by_author[author].append(pos)
+            for token in dict.fromkeys(title_tokens(title)):
+                self.by_token[token].append(pos)
+        # Sorted, so the tokens starting with a query word are one contiguous range
+        self.tokens = sorted(self.by_token)
+
+    def _any_of(self, index: Dict[str, array], keys: Iterable[str]) -> Set[int]:
+        result = set()
+        for key in keys:
+            result.update(index.get(key, EMPTY))
+        return result
+
+    def _prefix_postings(self, word: str) -> List[array]:
+        """Postings of every title token starting with word"""
+        start = bisect_left(self.tokens, word)
+        end = start
+        while end < len(self.tokens) and self.tokens[end].startswith(word):
+            end += 1
+        return [self.by_token[token] for token in self.tokens[start:end]]
+
+    def _title_matches(self, query: str, candidates: Optional[Set[int]]) -> Set[int]:
+        words = title_tokens(query)
+        if not words:
+            # Nothing to look up by word, as in the frontend
+            needle = query.strip().lower()
+            pool = candidates if candidates is not None else range(len(self.posts))
+            return {pos for pos in pool if needle in self.titles[pos]}
+
+        for word in words:
+            postings = self._prefix_postings(word)
+            # Merging every matching word's postings walks them all; checking a few titles is cheaper
+            if candidates is not None and len(candidates) * VERIFY_RATIO < sum(map(len, postings)):
+                candidates = {pos for pos in candidates
+                              if any(token.startswith(word) for token in title_tokens(self.titles[pos]))}
+            else:
+                hits = set()
+                for posting in postings:
+                    hits.update(posting)
+                candidates = hits if candidates is None else candidates & hits
+            if not candidates:
+                return set()
+        return candidates
+
+    def match(self, tags=(), authors=(), community_tags=(), query: str = '') -> List[int]:
+        """Return matching positions in date order (newest first)"""
+        result: Optional[Set[int]] = None
+        for index, keys in ((self.by_author, authors), (self.by_community_tag, community_tags)):
+            if keys:
+                hits = self._any_of(index, keys)
+                result = hits if result is None else result & hits
+        if tags:
+            if result is None:
+                result = self._any_of(self.by_tag, tags)
+            else:
+                # Already narrowed: test each candidate's tag bitmask instead
+                wanted = tag_mask(tags)
+                result = {pos for pos in result if self.posts[pos].tag_mask & wanted}
+        if query.strip():
+            result = self._title_matches(query, result)
+        if result is None:
+            return list(range(len(self.posts)))
+        return sorted(result)
+
+    def facet_counts(self, positions: List[int]) -> Dict[str, Dict[str, int]]:
+        """Count tags, authors and community tags across the matched posts"""
+        tags = Counter()
+        authors = Counter()
+        community = Counter()
+        for pos in positions:
+            post = self.posts[pos]
+            tags.update(post.get('tags', []))
+            community.update(post.get('community_tags', []))
+            if post.get('author'):
+                authors[post['author']] += 1
+        return {
+            'tags': dict(tags.most_common()),
+            'authors': dict(authors.most_common()),
+            'community_tags': dict(community.most_common()),
+        }
+
+    def encode_cursor(self, pos: int) -> str:
+        raw = f'{self.version}:{pos}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> int:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            version, pos = base64.urlsafe_b64decode(padded).decode().rsplit(':', 1)
+            pos = int(pos)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor('Malformed cursor')
+        if version != self.version:
+            raise InvalidCursor('Cursor is from an older version of the data; restart the search')
+        return pos
+
+    def search(self, tags=(), authors=(), community_tags=(), query: str = '',
+               cursor: Optional[str] = None, limit: int = 50) -> Dict:
+        """Filter, count facets and return one page of results"""
+        positions = self.match(tags, authors, community_tags, query)
+        start = bisect_right(positions, self.decode_cursor(cursor)) if cursor else 0
+        page = positions[start:start + limit]
+        has_more = start + limit < len(positions)
+        return {
+            'version': self.version,
+            'total': len(positions),
+            'posts': [self.posts[pos] for pos in page],
+            'next_cursor': self.encode_cursor(page[-1]) if has_more else None,
+            'facets': self.facet_counts(positions),
+        }
+
+    def client_index(self) -> Dict:
+        """Facet and title token indexes for filtering in the browser
+
+        Every posting is a sorted list of positions into `ids` (the posts in
+        date order) or a base64 bitset, whichever is smaller. `tokens` is
+        sorted so a query word can be resolved by prefix range lookup.
+        """
+        size = len(self.posts)
+
+        def encode(index: Dict[str, array]) -> Dict:
+            return {key: encode_positions(index[key].tolist(), size) for key in sorted(index)}
+
+        return {
+            'version': self.version,
+            'ids': [post['id'] for post in self.posts],
+            'tags': encode(self.by_tag),
+            'authors': encode(self.by_author),
+            'community_tags': encode(self.by_community_tag),
+            'tokens': self.tokens,
+            'postings': [encode_positions(self.by_token[token].tolist(), size) for token in self.tokens],
+        }
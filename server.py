@@ -1,67 +1,139 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, Response, jsonify, redirect, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import json
 import os
 
+from change_log import BIO, COMMUNITY_TAG, POST, ChangeLog
+from community_log import CommunityTagLog
+from compact import Post
+from http_cache import NDJSON_MIMETYPE, EncodedPayload, json_chunks, payload_response, stream_response
+from metrics import metrics
+from post_store import bootstrap_data, bootstrap_memo_key
+from search_index import InvalidCursor, SearchIndex
+from snapshot_file import MappedPostStore, MappedSnapshot, SnapshotPublisher
+from sqlite_store import SQLiteStore, configured_db_path
+
+class PostJSONProvider(DefaultJSONProvider):
+    """jsonify() that also serializes compact Post records"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Post):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = PostJSONProvider(app)
 CORS(app)
+# Timings, sizes and cache counters at /metrics when INKHAVEN_METRICS is set
+metrics.install(app)
+
+# index.html loads its data from this URL; the server swaps in the versioned one
+BOOTSTRAP_META = '<meta name="inkhaven-bootstrap" content="/api/bootstrap">'
+
+# Set INKHAVEN_DB to serve from SQLite instead of the JSON files
+db_path = configured_db_path()
+db = SQLiteStore(db_path) if db_path else None
+
+# Served from the shared snapshot.bin while it is current; otherwise parsed
+# once per worker and reloaded only when the underlying data changes
+store = MappedPostStore(db=db)
+# Republishes snapshot.bin after community tags are added
+publisher = SnapshotPublisher(store)
+# Serialized, append-only community tag writes shared by all workers
+community_log = CommunityTagLog()
+# Versioned record of changed keys for /api/changes
+change_log = ChangeLog()
+
+def cached_json(key, build):
+    """Serve a snapshot-derived payload, serializing it once per data version"""
+    snapshot = store.snapshot()
+    payload = snapshot.memo(
+        ('payload', key),
+        lambda: EncodedPayload.from_data(build(snapshot), snapshot.last_modified)
+    )
+    return payload_response(payload, request)
+
+def versioned_json(memo_key, path, version, build, snapshot):
+    """Like cached_json, but ?v=<version> URLs are immutable and stale ones redirect
+
+    `version` must change whenever the body can, and `memo_key` must be unique to it.
+    """
+    requested = request.args.get('v')
+    if requested is not None and requested != version:
+        return redirect(f'{path}?v={version}', code=302)
 
-def load_tagged_posts():
-    """Load tagged posts from cache"""
-    if os.path.exists('tagged_posts.json'):
-        with open('tagged_posts.json', 'r') as f:
-            return json.load(f)
-    return {}
-
-def load_community_tags():
-    """Load community-contributed tags"""
-    if os.path.exists('community_tags.json'):
-        with open('community_tags.json', 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_community_tags(tags):
-    """Save community-contributed tags"""
-    with open('community_tags.json', 'w') as f:
-        json.dump(tags, f, indent=2)
+    payload = snapshot.memo(
+        memo_key,
+        lambda: EncodedPayload.from_data(build(snapshot), snapshot.last_modified)
+    )
+    cache_control = 'public, max-age=31536000, immutable' if requested else 'no-cache'
+    return payload_response(payload, request, cache_control=cache_control)
+
+def build_search_index(snapshot):
+    with metrics.phase('index'):
+        # Mapped snapshots parse posts on access; the index reads them all repeatedly
+        return SearchIndex(list(snapshot.posts), snapshot.version)
+
+def search_index(snapshot):
+    return snapshot.memo('search_index', lambda: build_search_index(snapshot))
+
+def wants_stream():
+    """?stream=1, ?format=ndjson or an NDJSON Accept header ask for a streamed body"""
+    fmt = request.args.get('format', '')
+    ndjson = fmt == 'ndjson' or (
+        not fmt and request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE)
+    return ndjson or request.args.get('stream') == '1', ndjson
 
 @app.route('/api/posts')
 def get_posts():
-    """Get all tagged posts with community tags merged"""
-    tagged_posts = load_tagged_posts()
-    community_tags = load_community_tags()
-    
-    # Convert dict to list for easier frontend handling
-    posts_list = []
-    for post_id, post_data in tagged_posts.items():
-        post_dict = {
-            'id': post_id,
-            **post_data,
-            'community_tags': community_tags.get(post_id, [])
-        }
-        posts_list.append(post_dict)
-    
-    # Sort by date (newest first)
-    posts_list.sort(key=lambda x: x.get('date_modified', ''), reverse=True)
-    return jsonify(posts_list)
+    """Get all tagged posts with community tags merged
+
+    Streamed straight from the snapshot as JSON or NDJSON when asked for, so
+    large feeds start sending at once and never hold a whole serialized copy.
+    """
+    stream, ndjson = wants_stream()
+    if stream:
+        snapshot = store.snapshot()
+        if isinstance(snapshot, MappedSnapshot):
+            chunks = snapshot.posts_chunks(ndjson)
+        else:
+            chunks = json_chunks(snapshot.posts, ndjson)
+        return stream_response(chunks, snapshot.version, snapshot.last_modified, request, ndjson=ndjson)
+    return cached_json('posts', lambda snapshot: snapshot.posts)
+
+@app.route('/api/search')
+def search_posts():
+    """Filter posts by tag, author, community tag and title, one page at a time"""
+    index = search_index(store.snapshot())
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    try:
+        with metrics.phase('search'):
+            results = index.search(
+                tags=request.args.getlist('tag'),
+                authors=request.args.getlist('author'),
+                community_tags=request.args.getlist('community_tag'),
+                query=request.args.get('q', ''),
+                cursor=request.args.get('cursor'),
+                limit=limit
+            )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(results)
 
 @app.route('/api/tags')
 def get_tags():
     """Get all unique AI tags"""
-    tagged_posts = load_tagged_posts()
-    all_tags = set()
-    for post_data in tagged_posts.values():
-        all_tags.update(post_data.get('tags', []))
-    return jsonify(sorted(list(all_tags)))
+    return cached_json('tags', lambda snapshot: snapshot.tags)
 
 @app.route('/api/community-tags')
 def get_community_tags():
     """Get all unique community tags"""
-    community_tags = load_community_tags()
-    all_tags = set()
-    for tags_list in community_tags.values():
-        all_tags.update(tags_list)
-    return jsonify(sorted(list(all_tags)))
+    return cached_json('community_tags', lambda snapshot: snapshot.community_tags)
 
 @app.route('/api/community-tags/<path:post_id>', methods=['POST'])
 def add_community_tag(post_id):
@@ -72,43 +144,127 @@ def add_community_tag(post_id):
     if not new_tag:
         return jsonify({'error': 'Tag cannot be empty'}), 400
     
-    # Load existing community tags
-    community_tags = load_community_tags()
-    
-    # Add tag to post (avoid duplicates)
-    if post_id not in community_tags:
-        community_tags[post_id] = []
-    
-    if new_tag not in community_tags[post_id]:
-        community_tags[post_id].append(new_tag)
-        save_community_tags(community_tags)
-        return jsonify({'success': True, 'tag': new_tag})
-    
-    return jsonify({'success': False, 'message': 'Tag already exists'})
+    if db is not None:
+        if not db.add_community_tag(post_id, new_tag):
+            return jsonify({'success': False, 'message': 'Tag already exists'})
+    else:
+        # Check against the in-memory view; the log itself is append-only
+        existing = store.snapshot().community_map.get(post_id, [])
+        if new_tag in existing:
+            return jsonify({'success': False, 'message': 'Tag already exists'})
+        community_log.add(post_id, new_tag)
+
+    change_log.record(COMMUNITY_TAG, post_id)
+    if store.serving_mapped():
+        # Until then each worker applies new community tags on top of the mapped snapshot
+        publisher.schedule()
+    return jsonify({'success': True, 'tag': new_tag})
 
 @app.route('/api/authors')
 def get_authors():
     """Get all unique authors"""
-    tagged_posts = load_tagged_posts()
-    authors = set()
-    for post_data in tagged_posts.values():
-        author = post_data.get('author', '')
-        if author:
-            authors.add(author)
-    return jsonify(sorted(list(authors)))
+    return cached_json('authors', lambda snapshot: snapshot.authors)
+
+@app.route('/api/facets')
+def get_facets():
+    """Get post counts per AI tag, author and community tag"""
+    return cached_json('facets', lambda snapshot: snapshot.facets.counts())
 
 @app.route('/api/author-bios')
 def get_author_bios():
     """Get AI-generated author bios"""
-    if os.path.exists('author_bios.json'):
-        with open('author_bios.json', 'r') as f:
-            return jsonify(json.load(f))
-    return jsonify({})
+    return cached_json('author_bios', lambda snapshot: snapshot.author_bios)
+
+@app.route('/api/bootstrap')
+def get_bootstrap():
+    """Everything the page needs on load, from one consistent snapshot
+
+    With ?v=<snapshot version>-<change log>-<change version> matching the
+    current data and change log the response is immutable and can be cached
+    indefinitely; a stale one redirects to the current one.
+    """
+    # Read before the data, so the snapshot is at least as new as this version
+    change_log_id, change_version = change_log.current()
+    snapshot = store.snapshot()
+    # The body carries the change log position too, so the version and memo include it
+    return versioned_json(bootstrap_memo_key(change_log_id, change_version), '/api/bootstrap',
+                          bootstrap_version(snapshot, change_log_id, change_version),
+                          lambda snapshot: bootstrap_data(snapshot, change_log_id, change_version), snapshot)
+
+@app.route('/api/search-index')
+def get_search_index():
+    """Facet bitsets and title tokens for filtering posts in the browser
+
+    Versioned like /api/bootstrap: request it with the `version` from the
+    bootstrap data to get an immutable, long-cacheable response.
+    """
+    snapshot = store.snapshot()
+    return versioned_json(('payload', 'search_index'), '/api/search-index', snapshot.version,
+                          lambda snapshot: search_index(snapshot).client_index(), snapshot)
+
+@app.route('/api/changes')
+def get_changes():
+    """Posts, community tags and bios changed after a client's change version
+
+    Changed posts are returned whole, with community tags merged; ids that no
+    longer exist are listed in `removed`. If `since` is older than the change
+    log, or `log` names a different change log, the response only sets
+    `resync` and the client should reload /api/bootstrap.
+    """
+    try:
+        since = int(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+
+    # Read the log before the data, so the snapshot is at least as new as `version`
+    log_id, version, changed = change_log.since(since, request.args.get('log', ''))
+    if changed is None:
+        return jsonify({'change_log': log_id, 'version': version, 'resync': True})
+
+    snapshot = store.snapshot()
+    posts = []
+    removed = []
+    for post_id in dict.fromkeys(changed[POST] + changed[COMMUNITY_TAG]):
+        position = snapshot.positions.get(post_id)
+        if position is None:
+            removed.append(post_id)
+        else:
+            posts.append(snapshot.posts[position])
+
+    return jsonify({
+        'change_log': log_id,
+        'version': version,
+        'snapshot_version': snapshot.version,
+        'resync': False,
+        'posts': posts,
+        'removed': removed,
+        'author_bios': {author: snapshot.author_bios[author]
+                        for author in changed[BIO] if author in snapshot.author_bios},
+        'tags': snapshot.tags,
+        'authors': snapshot.authors,
+        'community_tags': snapshot.community_tags,
+    })
+
+@app.route('/api/store-stats')
+def get_store_stats():
+    """Cache hit/reload counters for this worker"""
+    return jsonify(store.stats())
+
+def bootstrap_version(snapshot, change_log_id, change_version):
+    return f'{snapshot.version}-{change_log_id}-{change_version}'
 
 @app.route('/')
 def index():
-    """Serve the main page"""
-    return send_from_directory('.', 'index.html')
+    """Serve the main page, pointed at the versioned bootstrap URL"""
+    with open('index.html', 'r', encoding='utf-8') as f:
+        html = f.read()
+    # Read before the data, as /api/bootstrap does
+    change_log_id, change_version = change_log.current()
+    version = bootstrap_version(store.snapshot(), change_log_id, change_version)
+    html = html.replace(BOOTSTRAP_META, BOOTSTRAP_META.replace('/api/bootstrap', f'/api/bootstrap?v={version}'))
+    response = Response(html, mimetype='text/html')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 if __name__ == '__main__':
     import os
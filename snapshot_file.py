@@ -0,0 +1,639 @@
+#!/usr/bin/env python3
+"""
+Binary post snapshot shared by all gunicorn workers through mmap.
+
+Publishing renders the current data into snapshot.bin:
+
+- every read payload the server memoizes (posts, tags, authors, community
+  tags, facets, author bios, bootstrap, search index), pre-serialized and
+  pre-compressed
+- one JSON record per post in date order, plus an offset table into them
+- the post ids in sorted order, with offset and position tables, so a post
+  can be found by id with a binary search
+
+The file is written under a temporary name and renamed over the old one, so
+readers always see a complete snapshot. Workers map it read-only: its pages
+live in the OS page cache once, however many workers serve from it, and a
+new worker starts serving without parsing anything. The header records the
+signature of the source files the snapshot was built from, and the server
+only uses it while the sources still match; otherwise it falls back to
+parsing them itself.
+
+tagger.py and generate_author_bios.py publish after a run, and the server
+republishes shortly after a community tag is added. Until then, each worker
+applies the new community tags on top of the mapped snapshot, re-parsing only
+the posts they touch. To publish by hand:
+
+    python snapshot_file.py publish
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from change_log import ChangeLog
+from community_log import COMMUNITY_TAGS_FILE
+from compact import Post, json_default
+from http_cache import EncodedPayload, view_chunks
+from journal import file_lock
+from metrics import metrics
+from facets import FacetIndex
+from post_store import (AUTHOR_BIOS_FILE, TAGGED_POSTS_FILE, PostStore, Snapshot, bootstrap_data,
+                        bootstrap_memo_key, file_signature, signature_last_modified, signature_version)
+from search_index import SearchIndex
+
+SNAPSHOT_FILE = 'snapshot.bin'
+MAGIC = b'INKSNAP1'
+# Sections start on 8-byte boundaries so offset tables can be cast in place
+ALIGN = 8
+# Posts parsed per json.loads call when iterating over all of them
+ITER_BATCH = 1000
+# Payloads that community tags added after publishing cannot change
+UNTAGGED_PAYLOADS = (('payload', 'tags'), ('payload', 'authors'), ('payload', 'author_bios'))
+
+
+def canonical_signature(signature: Tuple):
+    """The signature as it round-trips through the JSON header"""
+    return json.loads(json.dumps(signature))
+
+
+def snapshot_payloads(snapshot: Snapshot, posts: List[Post], change_log_id: str, change_version: int) -> Dict:
+    """Data for every payload memo the server fills, by name"""
+    return {
+        'tags': snapshot.tags,
+        'authors': snapshot.authors,
+        'community_tags': snapshot.community_tags,
+        'facets': snapshot.facets.counts(),
+        'author_bios': snapshot.author_bios,
+        'bootstrap': {**bootstrap_data(snapshot, change_log_id, change_version), 'posts': posts},
+        'search_index': SearchIndex(posts, snapshot.version).client_index(),
+    }
+
+
+class SnapshotWriter:
+    """Lays out named sections after a JSON header"""
+
+    def __init__(self):
+        self.sections: List[Tuple[str, bytes]] = []
+        self.size = 0
+        self.offsets: Dict[str, List[int]] = {}
+
+    def add(self, name: str, data: bytes):
+        padding = -self.size % ALIGN
+        if padding:
+            self.sections.append(('', b'\0' * padding))
+            self.size += padding
+        self.offsets[name] = [self.size, len(data)]
+        self.sections.append((name, data))
+        self.size += len(data)
+
+    def add_payload(self, header: Dict, name: str, payload: EncodedPayload):
+        encodings = payload.encodings()
+        for encoding in encodings:
+            self.add(f'payload/{name}/{encoding}', payload.variant(encoding))
+        header['payloads'][name] = {'etag': payload.etag, 'encodings': encodings}
+
+    def write(self, path: str, header: Dict):
+        header['sections'] = self.offsets
+        header_bytes = json.dumps(header).encode('utf-8')
+        prefix = MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+        prefix += b'\0' * (-len(prefix) % ALIGN)
+
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp',
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(prefix)
+                for _, data in self.sections:
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+def write_snapshot_file(snapshot: Snapshot, change_log_id: str, change_version: int,
+                        path: str = SNAPSHOT_FILE) -> Dict:
+    """Write snapshot.bin for a snapshot and return its header"""
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default).encode
+    # A mapped snapshot with community tags applied yields its posts lazily
+    posts = list(snapshot.posts)
+    records = [encode(post).encode('utf-8') for post in posts]
+    writer = SnapshotWriter()
+    header = {
+        'format': 1,
+        'byteorder': sys.byteorder,
+        'version': snapshot.version,
+        'signature': canonical_signature(snapshot.signature),
+        'last_modified': snapshot.last_modified,
+        'change_log': change_log_id,
+        'change_version': change_version,
+        'post_count': len(records),
+        'payloads': {},
+    }
+
+    # Posts in date order, one per line; record i spans record_offsets[i:i + 2]
+    record_offsets = array('Q', [0])
+    for record in records:
+        record_offsets.append(record_offsets[-1] + len(record) + 1)
+    writer.add('records', b''.join(record + b'\n' for record in records))
+    writer.add('record_offsets', record_offsets.tobytes())
+
+    # Ids in byte order with their date-order positions, for binary search
+    ids = [post.id.encode('utf-8') for post in posts]
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    id_offsets = array('Q', [0])
+    for pos in order:
+        id_offsets.append(id_offsets[-1] + len(ids[pos]))
+    writer.add('ids', b''.join(ids[pos] for pos in order))
+    writer.add('id_offsets', id_offsets.tobytes())
+    writer.add('id_positions', array('I', order).tobytes())
+
+    writer.add('community_map', json.dumps(snapshot.community_map, ensure_ascii=False).encode('utf-8'))
+
+    # The posts payload is the records as one array; no need to serialize them twice
+    posts_body = b'[' + b','.join(records) + b']'
+    writer.add_payload(header, 'posts', EncodedPayload(posts_body, snapshot.last_modified))
+    for name, data in snapshot_payloads(snapshot, posts, change_log_id, change_version).items():
+        writer.add_payload(header, name, EncodedPayload.from_data(data, snapshot.last_modified))
+
+    writer.write(path, header)
+    return header
+
+
+class SnapshotFile:
+    """A read-only mapping of snapshot.bin"""
+
+    def __init__(self, path: str = SNAPSHOT_FILE):
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.file_signature = (st.st_mtime_ns, st.st_size)
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+        if self.view[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a post snapshot')
+        (header_length,) = struct.unpack_from('<I', self.mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(self.view[start:start + header_length]))
+        if self.header.get('format') != 1 or self.header.get('byteorder') != sys.byteorder:
+            raise ValueError(f'{path} was written in an incompatible format')
+        end = start + header_length
+        self.base = end + (-end % ALIGN)
+
+    def section(self, name: str) -> memoryview:
+        offset, length = self.header['sections'][name]
+        return self.view[self.base + offset:self.base + offset + length]
+
+    def table(self, name: str, typecode: str) -> memoryview:
+        return self.section(name).cast(typecode)
+
+
+class MappedPayload:
+    """An EncodedPayload whose variants are slices of the mapping"""
+
+    def __init__(self, snapshot_file: SnapshotFile, name: str, last_modified: float):
+        info = snapshot_file.header['payloads'][name]
+        self.etag = info['etag']
+        self.last_modified = int(last_modified)
+        self._encodings = info['encodings']
+        self._file = snapshot_file
+        self._name = name
+
+    def encodings(self) -> List[str]:
+        return self._encodings
+
+    def variant(self, encoding: str) -> memoryview:
+        if encoding not in self._encodings:
+            encoding = 'identity'
+        return self._file.section(f'payload/{self._name}/{encoding}')
+
+
+class MappedPosts(Sequence):
+    """Date-ordered posts, each parsed from its record when accessed
+
+    `overrides` replaces the posts at some positions, e.g. ones that gained a
+    community tag since the snapshot was published.
+    """
+
+    def __init__(self, snapshot_file: SnapshotFile, overrides: Optional[Dict[int, Post]] = None):
+        self._records = snapshot_file.section('records')
+        self._offsets = snapshot_file.table('record_offsets', 'Q')
+        self.overrides: Dict[int, Post] = overrides or {}
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def record(self, pos: int) -> memoryview:
+        # Without the trailing newline
+        return self._records[self._offsets[pos]:self._offsets[pos + 1] - 1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[pos] for pos in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        post = self.overrides.get(index)
+        if post is not None:
+            return post
+        return Post.from_json(json.loads(bytes(self.record(index))))
+
+    def __iter__(self) -> Iterator[Post]:
+        # Records hold no raw newlines, so a run of them parses as one array
+        for start in range(0, len(self), ITER_BATCH):
+            stop = min(start + ITER_BATCH, len(self))
+            run = bytes(self._records[self._offsets[start]:self._offsets[stop] - 1])
+            for pos, data in enumerate(json.loads(b'[' + run.replace(b'\n', b',') + b']'), start):
+                yield self.overrides.get(pos) or Post.from_json(data)
+
+    def joined(self, separator: bytes) -> bytes:
+        """Every post serialized, in order, with `separator` between them"""
+        encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default).encode
+        parts = []
+        start = 0
+        for pos in sorted(self.overrides) + [len(self)]:
+            # Unchanged records are copied out of the mapping a run at a time
+            if pos > start:
+                run = bytes(self._records[self._offsets[start]:self._offsets[pos] - 1])
+                parts.append(run if separator == b'\n' else run.replace(b'\n', separator))
+            if pos < len(self):
+                parts.append(encode(self.overrides[pos]).encode('utf-8'))
+            start = pos + 1
+        return separator.join(parts)
+
+
+class MappedPositions(Mapping):
+    """Post id -> date-order position, by binary search over the sorted id table"""
+
+    def __init__(self, snapshot_file: SnapshotFile):
+        self._ids = snapshot_file.section('ids')
+        self._offsets = snapshot_file.table('id_offsets', 'Q')
+        self._positions = snapshot_file.table('id_positions', 'I')
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _id(self, i: int) -> bytes:
+        return bytes(self._ids[self._offsets[i]:self._offsets[i + 1]])
+
+    def __getitem__(self, post_id: str) -> int:
+        key = post_id.encode('utf-8')
+        i = self._bisect(key)
+        if i < len(self) and self._id(i) == key:
+            return self._positions[i]
+        raise KeyError(post_id)
+
+    def _bisect(self, key: bytes) -> int:
+        """First index whose id is not below key"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._id(i).decode('utf-8') for i in range(len(self)))
+
+
+class MappedSnapshot:
+    """The read side of Snapshot, served from a SnapshotFile
+
+    Payloads come straight from the mapping; anything else is parsed from
+    it on first use and kept. Community tags added after publishing are
+    applied on top with with_community_events, like Snapshot does.
+    """
+
+    def __init__(self, snapshot_file: SnapshotFile):
+        self.file = snapshot_file
+        header = snapshot_file.header
+        self.version = header['version']
+        self.signature = header['signature']
+        self.last_modified = header['last_modified']
+        self.change_log_id = header.get('change_log', '')
+        self.change_version = header['change_version']
+        self.posts = MappedPosts(snapshot_file)
+        self.positions = MappedPositions(snapshot_file)
+        self._memo = {('payload', name): MappedPayload(snapshot_file, name, self.last_modified)
+                      for name in header['payloads'] if name != 'bootstrap'}
+        self._memo[bootstrap_memo_key(self.change_log_id, self.change_version)] = \
+            MappedPayload(snapshot_file, 'bootstrap', self.last_modified)
+        self._memo_lock = threading.RLock()
+
+    def _payload_data(self, name: str):
+        return json.loads(bytes(self.file.section(f'payload/{name}/identity')))
+
+    @cached_property
+    def tags(self) -> List[str]:
+        return self._payload_data('tags')
+
+    @cached_property
+    def authors(self) -> List[str]:
+        return self._payload_data('authors')
+
+    @cached_property
+    def community_tags(self) -> List[str]:
+        return self._payload_data('community_tags')
+
+    @cached_property
+    def author_bios(self) -> Dict[str, str]:
+        return self._payload_data('author_bios')
+
+    @cached_property
+    def community_map(self) -> Dict[str, List[str]]:
+        return json.loads(bytes(self.file.section('community_map')))
+
+    @cached_property
+    def facets(self) -> FacetIndex:
+        return FacetIndex.from_counts(self._payload_data('facets'))
+
+    def with_community_events(self, events: List[Dict], signature: Tuple) -> 'MappedSnapshot':
+        """A new snapshot with appended community tag events applied
+
+        Only the posts that gained a tag are parsed; the rest still come from
+        the mapping, as do the payloads community tags cannot change.
+        """
+        community_map = dict(self.community_map)
+        facets = self.facets.copy()
+        overrides = dict(self.posts.overrides)
+        for event in events:
+            post_id, tag = event['post_id'], event['tag']
+            existing = community_map.get(post_id, [])
+            if tag in existing:
+                continue
+            tags_list = existing + [tag]
+            community_map[post_id] = tags_list
+            facets.community_tags.add(tag)
+            position = self.positions.get(post_id)
+            if position is not None:
+                overrides[position] = self.posts[position].with_community_tags(tags_list)
+
+        snapshot = MappedSnapshot.__new__(MappedSnapshot)
+        snapshot.file = self.file
+        snapshot.signature = signature
+        snapshot.version = signature_version(signature)
+        snapshot.last_modified = signature_last_modified(signature)
+        snapshot.change_log_id = self.change_log_id
+        snapshot.change_version = self.change_version
+        snapshot.posts = MappedPosts(self.file, overrides)
+        snapshot.positions = self.positions
+        snapshot.tags = self.tags
+        snapshot.authors = self.authors
+        snapshot.author_bios = self.author_bios
+        snapshot.community_map = community_map
+        snapshot.facets = facets
+        snapshot.community_tags = facets.community_tags.sorted()
+        snapshot._memo = {key: self._memo[key] for key in UNTAGGED_PAYLOADS if key in self._memo}
+        snapshot._memo_lock = threading.RLock()
+        return snapshot
+
+    def _build(self, key, factory):
+        """Serialize the posts and bootstrap payloads from the records instead of via `factory`
+
+        Their factories hand json the posts sequence, which it cannot serialize.
+        """
+        if key == ('payload', 'posts'):
+            with metrics.phase('serialize'):
+                body = b'[' + self.posts.joined(b',') + b']'
+            return EncodedPayload(body, self.last_modified)
+        if isinstance(key, tuple) and key[:2] == ('payload', 'bootstrap'):
+            with metrics.phase('serialize'):
+                # Field by field, as json.dumps would, with the posts array spliced in from the records
+                fields = []
+                for name, value in bootstrap_data(self, key[2], key[3]).items():
+                    if name == 'posts':
+                        value = b'[' + self.posts.joined(b',') + b']'
+                    else:
+                        value = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                    fields.append(json.dumps(name).encode('utf-8') + b':' + value)
+                body = b'{' + b','.join(fields) + b'}'
+            return EncodedPayload(body, self.last_modified)
+        return factory()
+
+    def memo(self, key, factory):
+        """Same contract as Snapshot.memo; published payloads are already there"""
+        cache = key[0] if isinstance(key, tuple) else key
+        try:
+            value = self._memo[key]
+        except KeyError:
+            pass
+        else:
+            metrics.cache(cache, True)
+            return value
+        with self._memo_lock:
+            if key not in self._memo:
+                metrics.cache(cache, False)
+                self._memo[key] = self._build(key, factory)
+            return self._memo[key]
+
+    def posts_chunks(self, ndjson: bool = False) -> Iterator[bytes]:
+        """The posts as a JSON array or NDJSON, straight from the mapping"""
+        if self.posts.overrides:
+            if ndjson:
+                return view_chunks(memoryview(self.posts.joined(b'\n') + b'\n'))
+            return view_chunks(memoryview(self.memo(('payload', 'posts'), None).variant('identity')))
+        if ndjson:
+            return view_chunks(self.file.section('records'))
+        return view_chunks(self._memo[('payload', 'posts')].variant('identity'))
+
+
+def parsed_only(snapshot) -> Optional[Snapshot]:
+    return None if isinstance(snapshot, MappedSnapshot) else snapshot
+
+
+class MappedPostStore(PostStore):
+    """A PostStore that serves from snapshot.bin while it matches the source files"""
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_FILE, **kwargs):
+        super().__init__(**kwargs)
+        self.snapshot_path = snapshot_path
+        self._mapped: Optional[MappedSnapshot] = None
+        self.mapped_hits = 0
+
+    def _current_mapped(self) -> Optional[MappedSnapshot]:
+        """The mapped snapshot for the file on disk now, reopening it if it was replaced"""
+        file_sig = file_signature(self.snapshot_path)
+        if file_sig is None:
+            self._mapped = None
+            return None
+        mapped = self._mapped
+        if mapped is not None and mapped.file.file_signature == file_sig:
+            return mapped
+        with self._lock:
+            mapped = self._mapped
+            if mapped is None or mapped.file.file_signature != file_sig:
+                try:
+                    with metrics.phase('map_snapshot'):
+                        mapped = MappedSnapshot(SnapshotFile(self.snapshot_path))
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"✗ Ignoring {self.snapshot_path}: {e}")
+                    mapped = None
+                # Requests still holding the old mapping keep it alive until they finish
+                self._mapped = mapped
+            return mapped
+
+    def snapshot(self):
+        """The mapped snapshot if it is fresh, otherwise the parsed one"""
+        with metrics.phase('stat'):
+            signature = self._signature()
+        mapped = self._current_mapped()
+        if mapped is not None and mapped.signature == canonical_signature(signature):
+            if self._snapshot is not None:
+                # Drop this worker's own copy now that the shared one is current
+                self.invalidate()
+            self.mapped_hits += 1
+            metrics.cache('snapshot', True)
+            return mapped
+        if mapped is not None and self._snapshot is None:
+            self._start_from_mapped(mapped, signature)
+        return super().snapshot()
+
+    def _start_from_mapped(self, mapped: MappedSnapshot, signature: Tuple):
+        """Use the mapped snapshot as the base for folding in the community journal
+
+        Only if community tags are all that changed since publishing; then
+        PostStore's incremental path applies them without parsing the rest.
+        """
+        published = mapped.signature
+        current = canonical_signature(signature)
+        if self.db is not None or published[:3] != current[:3] or published[4] != current[4]:
+            return
+        with self._lock:
+            if self._snapshot is None:
+                base_signature = tuple(tuple(sig) if sig is not None else None for sig in published)
+                self._snapshot = mapped.with_community_events([], base_signature)
+                # Tag events are idempotent, so folding the whole journal again is safe
+                self._community_offset = 0
+
+    # A full reload can't reuse anything from a mapped snapshot
+    def _load_posts(self, current, signature: Tuple) -> Dict:
+        return super()._load_posts(parsed_only(current), signature)
+
+    def _load_community(self, current, signature: Tuple) -> Dict:
+        return super()._load_community(parsed_only(current), signature)
+
+    def _load_bios(self, current, signature: Tuple) -> Dict:
+        return super()._load_bios(parsed_only(current), signature)
+
+    def parsed_snapshot(self):
+        """This worker's own snapshot (parsed, or mapped with later community tags), even if the mapped one is current"""
+        return super().snapshot()
+
+    def serving_mapped(self) -> bool:
+        return self._mapped is not None
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        mapped = self._mapped
+        stats['mapped_hits'] = self.mapped_hits
+        stats['mapped_version'] = mapped.version if mapped else None
+        if self._snapshot is None and mapped is not None:
+            stats['posts'] = len(mapped.posts)
+        return stats
+
+
+def publish(path: str = SNAPSHOT_FILE, db=None, force: bool = False,
+            store: Optional[PostStore] = None) -> Optional[Dict]:
+    """Write snapshot.bin from the current data, unless it is already up to date
+
+    A server passes its own store, so the data it has already parsed is
+    reused. Returns the new header, or None if nothing needed publishing.
+    """
+    with file_lock(path + '.lock'):
+        # Read the change log first, as the server does, so the data is at least this new
+        change_log_id, change_version = ChangeLog().current()
+        if store is None:
+            store = PostStore(db=db)
+        if not force and os.path.exists(path):
+            try:
+                current = SnapshotFile(path).header
+            except (OSError, ValueError, KeyError):
+                current = None
+            if (current is not None and current['signature'] == canonical_signature(store._signature())
+                    and current.get('change_log') == change_log_id
+                    and current['change_version'] == change_version):
+                return None
+        if isinstance(store, MappedPostStore):
+            snapshot = store.parsed_snapshot()
+        else:
+            snapshot = store.snapshot()
+        return write_snapshot_file(snapshot, change_log_id, change_version, path)
+
+
+class SnapshotPublisher:
+    """Republishes a store's snapshot.bin in the background, `delay` seconds after the first request"""
+
+    def __init__(self, store: 'MappedPostStore', delay: float = 10.0):
+        self.store = store
+        self.delay = delay
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def schedule(self):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self):
+        with self._lock:
+            self._timer = None
+        try:
+            publish(self.store.snapshot_path, store=self.store)
+        except Exception as e:
+            print(f"✗ Publishing {self.store.snapshot_path} failed: {e}")
+
+
+def publishes_from(path: str) -> bool:
+    """True if publish() reads this data file, however the path is spelled"""
+    sources = {os.path.realpath(source) for source in (TAGGED_POSTS_FILE, COMMUNITY_TAGS_FILE, AUTHOR_BIOS_FILE)}
+    return os.path.realpath(path) in sources
+
+
+def republish(path: str = SNAPSHOT_FILE, db=None):
+    """Publish after a data update, if this deployment serves from a snapshot file"""
+    if not os.path.exists(path):
+        return
+    header = publish(path, db=db)
+    if header is not None:
+        print(f"✓ Published {path} ({header['post_count']} posts, version {header['version']})")
+
+
+if __name__ == "__main__":
+    from sqlite_store import SQLiteStore, configured_db_path
+
+    parser = argparse.ArgumentParser(description="Publish the binary post snapshot served by gunicorn workers")
+    parser.add_argument('command', choices=['publish', 'info'])
+    parser.add_argument('--path', default=SNAPSHOT_FILE)
+    parser.add_argument('--force', action='store_true', help="rewrite even if it is up to date")
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        header = SnapshotFile(args.path).header
+        print(f"{args.path}: {header['post_count']} posts, version {header['version']}, "
+              f"change version {header['change_version']}, {os.path.getsize(args.path):,} bytes")
+    else:
+        db_path = configured_db_path()
+        header = publish(args.path, db=SQLiteStore(db_path) if db_path else None, force=args.force)
+        if header is None:
+            print(f"✓ {args.path} is already up to date")
+        else:
+            print(f"✓ Published {args.path} ({header['post_count']} posts, version {header['version']}, "
+                  f"{os.path.getsize(args.path):,} bytes)")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Optional SQLite storage backend for posts, tags, community tags and bios.
+
+Replaces tagged_posts.json, community_tags.json and author_bios.json with one
+WAL-mode database, so writes are single-row inserts rather than whole-file
+rewrites. Enable it for the server, tagger and
+bio generator by setting INKHAVEN_DB to the database path.
+
+    python sqlite_store.py import [inkhaven.db]   # JSON files -> database
+    python sqlite_store.py export [inkhaven.db]   # database -> JSON files
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from community_log import COMMUNITY_TAGS_FILE, fold_events
+from journal import JsonJournal, atomic_write_json, journal_path_for, load_json_file
+
+DEFAULT_DB = 'inkhaven.db'
+AUTHOR_BIOS_FILE = 'author_bios.json'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS authors (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    bio TEXT
+);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    author_id INTEGER REFERENCES authors(id),
+    date_modified TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS posts_by_date ON posts(date_modified DESC);
+CREATE INDEX IF NOT EXISTS posts_by_author ON posts(author_id);
+
+CREATE TABLE IF NOT EXISTS post_tags (
+    post_id TEXT NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (post_id, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS post_tags_by_tag ON post_tags(tag);
+
+CREATE TABLE IF NOT EXISTS community_tags (
+    -- Only ever grows, so readers can fetch just the rows added since they last looked
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (post_id, tag)
+);
+CREATE INDEX IF NOT EXISTS community_tags_by_tag ON community_tags(tag);
+
+-- Bumped by the triggers below on any change a reader can't apply incrementally
+CREATE TABLE IF NOT EXISTS data_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO data_versions(name, version) VALUES ('posts', 0), ('authors', 0), ('community_removed', 0);
+"""
+
+
+def _version_triggers() -> str:
+    triggers = []
+    for table, name, events in (('posts', 'posts', ('INSERT', 'UPDATE', 'DELETE')),
+                                ('post_tags', 'posts', ('INSERT', 'UPDATE', 'DELETE')),
+                                ('authors', 'authors', ('INSERT', 'UPDATE', 'DELETE')),
+                                ('community_tags', 'community_removed', ('UPDATE', 'DELETE'))):
+        for event in events:
+            triggers.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table} BEGIN\n"
+                f"    UPDATE data_versions SET version = version + 1 WHERE name = '{name}';\n"
+                f"END;\n"
+            )
+    return ''.join(triggers)
+
+
+SCHEMA += _version_triggers()
+
+
+def configured_db_path() -> Optional[str]:
+    """Database path from INKHAVEN_DB, or None to use the JSON files"""
+    return os.environ.get('INKHAVEN_DB') or None
+
+
+class SQLiteStore:
+    """Posts, tags, community tags and author bios in one SQLite database"""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """One connection per thread, in WAL mode"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def signature(self) -> Tuple:
+        """Changes whenever another connection commits, for cache invalidation"""
+        stats = []
+        for path in (self.path, self.path + '-wal'):
+            try:
+                st = os.stat(path)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    # Reads, in the same shapes as the JSON files
+
+    def load_tagged_posts(self) -> Dict[str, Dict]:
+        conn = self.connection()
+        tags: Dict[str, List[str]] = {}
+        for post_id, tag in conn.execute('SELECT post_id, tag FROM post_tags ORDER BY post_id, position'):
+            tags.setdefault(post_id, []).append(tag)
+
+        tagged_posts = {}
+        rows = conn.execute(
+            "SELECT p.id, p.title, p.url, COALESCE(a.name, ''), p.date_modified "
+            'FROM posts p LEFT JOIN authors a ON a.id = p.author_id ORDER BY p.rowid'
+        )
+        for post_id, title, url, author, date_modified in rows:
+            tagged_posts[post_id] = {
+                'title': title,
+                'url': url,
+                'author': author,
+                'date_modified': date_modified,
+                'tags': tags.get(post_id, [])
+            }
+        return tagged_posts
+
+    def load_community_tags(self) -> Dict[str, List[str]]:
+        community_tags: Dict[str, List[str]] = {}
+        rows = self.connection().execute('SELECT post_id, tag FROM community_tags ORDER BY seq')
+        for post_id, tag in rows:
+            community_tags.setdefault(post_id, []).append(tag)
+        return community_tags
+
+    def data_versions(self) -> Tuple[int, int, int, int]:
+        """(posts, authors, community tag removals, last community tag seq)
+
+        Readers that saw the same first three values only need the community
+        tags added after the seq they saw, from community_tags_between().
+        """
+        conn = self.connection()
+        versions = dict(conn.execute('SELECT name, version FROM data_versions'))
+        seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM community_tags').fetchone()[0]
+        return versions['posts'], versions['authors'], versions['community_removed'], seq
+
+    def community_tags_between(self, after: int, upto: int) -> List[Dict]:
+        """Community tags added with after < seq <= upto, as community journal events"""
+        rows = self.connection().execute(
+            'SELECT post_id, tag FROM community_tags WHERE seq > ? AND seq <= ? ORDER BY seq', (after, upto))
+        return [{'post_id': post_id, 'tag': tag} for post_id, tag in rows]
+
+    def load_author_bios(self) -> Dict[str, str]:
+        rows = self.connection().execute('SELECT name, bio FROM authors WHERE bio IS NOT NULL ORDER BY name')
+        return dict(rows)
+
+    # Writes
+
+    def _author_id(self, conn: sqlite3.Connection, name: str) -> Optional[int]:
+        if not name:
+            return None
+        conn.execute('INSERT OR IGNORE INTO authors(name) VALUES (?)', (name,))
+        return conn.execute('SELECT id FROM authors WHERE name = ?', (name,)).fetchone()[0]
+
+    def _upsert_post(self, conn: sqlite3.Connection, post_id: str, record: Dict):
+        conn.execute(
+            'INSERT INTO posts(id, title, url, author_id, date_modified) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET title = excluded.title, url = excluded.url, '
+            'author_id = excluded.author_id, date_modified = excluded.date_modified',
+            (post_id, record.get('title', ''), record.get('url', ''),
+             self._author_id(conn, record.get('author', '')), record.get('date_modified', ''))
+        )
+        conn.execute('DELETE FROM post_tags WHERE post_id = ?', (post_id,))
+        conn.executemany(
+            'INSERT OR IGNORE INTO post_tags(post_id, tag, position) VALUES (?, ?, ?)',
+            [(post_id, tag, i) for i, tag in enumerate(record.get('tags', []))]
+        )
+
+    def upsert_post(self, post_id: str, record: Dict):
+        """Insert or replace one tagged post"""
+        with self.connection() as conn:
+            self._upsert_post(conn, post_id, record)
+
+    def add_community_tag(self, post_id: str, tag: str) -> bool:
+        """Record a community tag; returns False if the post already had it"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO community_tags(post_id, tag, created_at) VALUES (?, ?, ?)',
+                (post_id, tag, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def set_author_bio(self, author: str, bio: str):
+        self.set_author_bios({author: bio})
+
+    def set_author_bios(self, bios: Dict[str, str]):
+        """Store several bios in one transaction"""
+        with self.connection() as conn:
+            for author, bio in bios.items():
+                author_id = self._author_id(conn, author)
+                conn.execute('UPDATE authors SET bio = ? WHERE id = ?', (bio, author_id))
+
+    # Conversion to and from the JSON files
+
+    def import_json(self, posts_file: str = 'tagged_posts.json', community_file: str = COMMUNITY_TAGS_FILE,
+                    bios_file: str = AUTHOR_BIOS_FILE) -> Dict[str, int]:
+        """Load the JSON files (and any uncompacted journals) into the database"""
+        tagged_posts = load_json_file(posts_file)
+        for entry in JsonJournal(journal_path_for(posts_file)).replay():
+            tagged_posts[entry.pop('id')] = entry
+        community_tags = fold_events(load_json_file(community_file),
+                                     JsonJournal(journal_path_for(community_file)).replay())
+        author_bios = load_json_file(bios_file)
+
+        now = time.time()
+        with self.connection() as conn:
+            for post_id, record in tagged_posts.items():
+                self._upsert_post(conn, post_id, record)
+            for post_id, tags in community_tags.items():
+                conn.executemany(
+                    'INSERT OR IGNORE INTO community_tags(post_id, tag, created_at) VALUES (?, ?, ?)',
+                    # Offsets keep each post's existing tag order
+                    [(post_id, tag, now + i * 1e-6) for i, tag in enumerate(tags)]
+                )
+            for author, bio in author_bios.items():
+                author_id = self._author_id(conn, author)
+                conn.execute('UPDATE authors SET bio = ? WHERE id = ?', (bio, author_id))
+
+        return {
+            'posts': len(tagged_posts),
+            'community_tags': sum(len(tags) for tags in community_tags.values()),
+            'author_bios': len(author_bios),
+        }
+
+    def export_json(self, posts_file: str = 'tagged_posts.json', community_file: str = COMMUNITY_TAGS_FILE,
+                    bios_file: str = AUTHOR_BIOS_FILE) -> Dict[str, int]:
+        """Write the database back out in the JSON file formats"""
+        tagged_posts = self.load_tagged_posts()
+        community_tags = self.load_community_tags()
+        author_bios = self.load_author_bios()
+        atomic_write_json(posts_file, tagged_posts, indent=2)
+        atomic_write_json(community_file, community_tags, indent=2)
+        atomic_write_json(bios_file, author_bios, indent=2)
+        return {
+            'posts': len(tagged_posts),
+            'community_tags': sum(len(tags) for tags in community_tags.values()),
+            'author_bios': len(author_bios),
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[1] not in ('import', 'export'):
+        print(__doc__)
+        sys.exit(1)
+
+    db_path = sys.argv[2] if len(sys.argv) == 3 else (configured_db_path() or DEFAULT_DB)
+    db = SQLiteStore(db_path)
+    if sys.argv[1] == 'import':
+        counts = db.import_json()
+        print(f"✓ Imported {counts['posts']} posts, {counts['community_tags']} community tags "
+              f"and {counts['author_bios']} bios into {db_path}")
+    else:
+        counts = db.export_json()
+        print(f"✓ Exported {counts['posts']} posts, {counts['community_tags']} community tags "
+              f"and {counts['author_bios']} bios from {db_path}")
@@ -1,141 +1,351 @@
+import argparse
 import json
 import os
-from typing import List, Dict, Optional
-from anthropic import Anthropic
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional
+
+from author_resolver import get_resolver
+from change_log import POST, ChangeLog
+from compact import intern_record
+from facets import FacetIndex
+from journal import JsonJournal, atomic_write_json, journal_path_for
+from model_client import MODEL, AdaptiveRateLimiter, call_with_retries, default_client
+from pretagger import PreTagger
+from snapshot_file import publishes_from, republish
+from sqlite_store import SQLiteStore, configured_db_path
+
+VALID_TAGS = [
+    'ai-safety', 'technical-ml', 'mathematics', 'statistics', 'biology',
+    'physics', 'chemistry', 'philosophy', 'moral-philosophy', 'technology',
+    'programming', 'politics', 'economics', 'society', 'personal',
+    'life-advice', 'rationality', 'epistemology', 'history', 'art',
+    'literature', 'music', 'psychology', 'neuroscience', 'religion',
+    'education', 'science-fiction', 'games', 'humor', 'travel'
+]
+
+# Matches "3: tag, tag" style lines in a batched response
+BATCH_LINE = re.compile(r'^\s*\[?(\d+)\]?\s*[:.)\-]\s*(.*)$')
 
 class PostTagger:
-    def __init__(self, cache_file="tagged_posts.json"):
+    def __init__(self, cache_file="tagged_posts.json", client=None, max_rate: float = 2.0,
+                 compact_every: int = 50, db=None, change_log: Optional[ChangeLog] = None,
+                 pretagger: Optional[PreTagger] = None):
         self.cache_file = cache_file
+        # Optional SQLiteStore used instead of the JSON cache and journal
+        self.db = db
+        # New results are appended here and folded into cache_file periodically
+        self.journal = JsonJournal(journal_path_for(cache_file))
+        self.compact_every = compact_every
+        # Lets clients fetch just the posts tagged since their last visit
+        self.change_log = change_log if change_log is not None else ChangeLog()
+        self._journaled = 0
         self.tagged_posts = self._load_cache()
-        self.client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        
+        # Tag and author counts, updated as each result is recorded
+        self.facets = FacetIndex.from_posts(self.tagged_posts)
+        # Anything with a messages.create() works, e.g. a local fake for tests
+        self.client = client if client is not None else default_client()
+        self.limiter = AdaptiveRateLimiter(max_rate=max_rate)
+        self.api_calls = 0
+        # Optional local classifier consulted before the model
+        self.pretagger = pretagger
+        self.pretagged = 0
+        self._lock = threading.RLock()
+
     def _load_cache(self) -> Dict:
-        """Load previously tagged posts from cache"""
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, 'r') as f:
-                return json.load(f)
-        return {}
-    
+        """Load previously tagged posts from cache, replaying any unsaved journal entries"""
+        if self.db is not None:
+            tagged_posts = self.db.load_tagged_posts()
+        else:
+            tagged_posts = {}
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r') as f:
+                    tagged_posts = json.load(f)
+
+            for entry in self.journal.replay():
+                tagged_posts[entry.pop('id')] = entry
+                self._journaled += 1
+            if self._journaled:
+                print(f"Resuming: replayed {self._journaled} journaled tags from an interrupted run")
+
+        # Author and tag names repeat across posts; keep one copy of each
+        for post_data in tagged_posts.values():
+            intern_record(post_data)
+        return tagged_posts
+
     def _save_cache(self):
         """Save tagged posts to cache"""
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.tagged_posts, f, indent=2)
-    
-    def tag_post(self, post: Dict) -> List[str]:
-        """Use Claude to tag a post based on its title and URL"""
-        post_id = post['id']
-        
-        # Check cache first
-        if post_id in self.tagged_posts:
-            return self.tagged_posts[post_id]['tags']
-        
+        atomic_write_json(self.cache_file, self.tagged_posts, indent=2)
+
+    def compact(self):
+        """Fold the journal into the cache file and start a fresh journal"""
+        with self._lock:
+            if not self._journaled:
+                return
+            self._save_cache()
+            self.journal.clear()
+            self._journaled = 0
+
+    def _post_fields(self, post: Dict):
         title = post.get('title', '')
         url = post.get('url', '')
         author = post.get('author', {}).get('name', '')
-        
-        prompt = f"""You are a tagging system. Based on the blog post title and URL below, return ONLY a comma-separated list of 1-4 relevant tags. Do not explain or justify your choices.
+        if not author and url:
+            # Feed items without an author block fall back to the domain mapping
+            author = get_resolver().resolve(url)['name']
+        return title, url, author
+
+    def _build_prompt(self, post: Dict) -> str:
+        title, url, author = self._post_fields(post)
+        return f"""You are a tagging system. Based on the blog post title and URL below, return ONLY a comma-separated list of 1-4 relevant tags. Do not explain or justify your choices.
 
-Available tags: ai-safety, technical-ml, mathematics, statistics, biology, physics, chemistry, philosophy, moral-philosophy, technology, programming, politics, economics, society, personal, life-advice, rationality, epistemology, history, art, literature, music, psychology, neuroscience, religion, education, science-fiction, games, humor, travel
+Available tags: {', '.join(VALID_TAGS)}
 
 Title: {title}
 URL: {url}
 Author: {author}
 
 Response format (example): technical-ml, mathematics"""
-        
-        try:
-            message = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=150,
+
+    def _build_batch_prompt(self, posts: List[Dict]) -> str:
+        entries = []
+        for i, post in enumerate(posts, 1):
+            title, url, author = self._post_fields(post)
+            entries.append(f"{i}. Title: {title}\n   URL: {url}\n   Author: {author}")
+        return f"""You are a tagging system. For each numbered blog post below, choose 1-4 relevant tags based on its title and URL. Return ONLY one line per post in the form "<number>: tag, tag". Do not explain or justify your choices.
+
+Available tags: {', '.join(VALID_TAGS)}
+
+{chr(10).join(entries)}
+
+Response format (example):
+1: technical-ml, mathematics
+2: personal"""
+
+    def _parse_tags(self, tags_str: str) -> List[str]:
+        """Keep only valid tags from a comma-separated response, defaulting to 'personal'"""
+        raw_tags = [tag.strip().lower() for tag in tags_str.split(',')]
+        tags = [tag for tag in raw_tags if tag in VALID_TAGS]
+        return tags or ['personal']
+
+    def _request(self, prompt: str, max_tokens: int) -> str:
+        with self._lock:
+            self.api_calls += 1
+        message = call_with_retries(
+            lambda: self.client.messages.create(
+                model=MODEL,
+                max_tokens=max_tokens,
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
-            )
-            
-            # Parse the response - extract just the tags
-            response_text = message.content[0].text.strip()
-            
-            # If response has multiple lines, try to find the line with tags
-            lines = response_text.split('\n')
-            tags_str = lines[0]  # Usually the tags are in the first line
-            
-            # Clean up the response and extract only valid tags
-            valid_tags = {
-                'ai-safety', 'technical-ml', 'mathematics', 'statistics', 'biology',
-                'physics', 'chemistry', 'philosophy', 'moral-philosophy', 'technology',
-                'programming', 'politics', 'economics', 'society', 'personal',
-                'life-advice', 'rationality', 'epistemology', 'history', 'art',
-                'literature', 'music', 'psychology', 'neuroscience', 'religion',
-                'education', 'science-fiction', 'games', 'humor', 'travel'
-            }
-            
-            # Split by comma and filter for valid tags only
-            raw_tags = [tag.strip().lower() for tag in tags_str.split(',')]
-            tags = [tag for tag in raw_tags if tag in valid_tags]
-            
-            # If no valid tags found, default to 'personal'
-            if not tags:
-                tags = ['personal']
-            
-            # Cache the result
-            self.tagged_posts[post_id] = {
-                'title': title,
-                'url': url,
-                'author': author,
-                'date_modified': post.get('date_modified', ''),
-                'tags': tags
-            }
-            self._save_cache()
-            
-            return tags
-            
+            ),
+            self.limiter
+        )
+        return message.content[0].text.strip()
+
+    def _record(self, post: Dict, tags: List[str]):
+        """Cache a tagging result"""
+        title, url, author = self._post_fields(post)
+        record = intern_record({
+            'title': title,
+            'url': url,
+            'author': author,
+            'date_modified': post.get('date_modified', ''),
+            'tags': tags
+        })
+        with self._lock:
+            previous = self.tagged_posts.get(post['id'])
+            if previous is not None:
+                self.facets.remove_post(previous)
+            self.facets.add_post(record)
+            self.tagged_posts[post['id']] = record
+            if self.db is not None:
+                self.db.upsert_post(post['id'], record)
+            else:
+                self.journal.append({'id': post['id'], **record})
+                self._journaled += 1
+                if self._journaled >= self.compact_every:
+                    self.compact()
+        # Only after the data is written, so a client never sees a version ahead of it
+        self.change_log.record(POST, post['id'])
+
+    def _pretag(self, post: Dict) -> Optional[List[str]]:
+        """Tag a post locally if the pre-tagger is confident, recording the result"""
+        if self.pretagger is None:
+            return None
+        title, url, _ = self._post_fields(post)
+        tags = self.pretagger.predict(title, url)
+        if tags:
+            self._record(post, tags)
+            with self._lock:
+                self.pretagged += 1
+        return tags
+
+    def _tag_uncached(self, post: Dict) -> List[str]:
+        """Tag a single post with the model, raising on failure"""
+        response_text = self._request(self._build_prompt(post), max_tokens=150)
+        # Usually the tags are in the first line
+        tags = self._parse_tags(response_text.split('\n')[0])
+        self._record(post, tags)
+        return tags
+
+    def tag_post(self, post: Dict) -> List[str]:
+        """Use Claude to tag a post based on its title and URL"""
+        post_id = post['id']
+
+        # Check cache first
+        if post_id in self.tagged_posts:
+            return self.tagged_posts[post_id]['tags']
+
+        try:
+            return self._pretag(post) or self._tag_uncached(post)
         except Exception as e:
-            print(f"Error tagging post {title}: {e}")
+            print(f"Error tagging post {post.get('title', '')}: {e}")
             return ['uncategorized']
-    
-    def tag_all_posts(self, feed_file="inkhaven_feed.json", max_posts: Optional[int] = None):
+
+    def _tag_batch(self, posts: List[Dict]) -> Dict[str, List[str]]:
+        """Tag several posts with one model call, parsing the result per post"""
+        if len(posts) == 1:
+            return {posts[0]['id']: self._tag_uncached(posts[0])}
+
+        response_text = self._request(self._build_batch_prompt(posts), max_tokens=40 * len(posts) + 50)
+        results = {}
+        for line in response_text.split('\n'):
+            match = BATCH_LINE.match(line)
+            if not match:
+                continue
+            index = int(match.group(1)) - 1
+            if 0 <= index < len(posts) and posts[index]['id'] not in results:
+                post = posts[index]
+                results[post['id']] = self._parse_tags(match.group(2))
+                self._record(post, results[post['id']])
+
+        # Anything the model skipped or garbled gets its own call
+        for post in posts:
+            if post['id'] not in results:
+                results[post['id']] = self._tag_uncached(post)
+        return results
+
+    def _tag_concurrently(self, posts: List[Dict], workers: int, batch_size: int) -> List:
+        """Tag uncached posts on a thread pool, batch_size posts per model call"""
+        batches = [posts[i:i + batch_size] for i in range(0, len(posts), batch_size)]
+        done = 0
+        failures = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self._tag_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.extend((post, e) for post in batch if post['id'] not in self.tagged_posts)
+                done += len(batch)
+                print(f"[{done}/{len(posts)}] Tagged batch of {len(batch)} "
+                      f"(rate interval {self.limiter.interval:.2f}s)")
+        return failures
+
+    def tag_all_posts(self, feed_file="inkhaven_feed.json", max_posts: Optional[int] = None,
+                      workers: int = 1, batch_size: int = 1):
         """Tag all posts in the feed"""
         with open(feed_file, 'r') as f:
             feed = json.load(f)
-        
+
         posts = feed.get('items', [])
         if max_posts:
             posts = posts[:max_posts]
-        
+
         total = len(posts)
         print(f"Processing {total} posts...")
-        
+        started = time.monotonic()
+        calls_before = self.api_calls
+        throttled_before = self.limiter.throttled
+        pretagged_before = self.pretagged
+
+        cached = 0
+        pending = []
+        failures = []
         for i, post in enumerate(posts, 1):
             post_id = post['id']
             if post_id in self.tagged_posts:
+                cached += 1
                 print(f"[{i}/{total}] Skipping (cached): {post.get('title', 'Untitled')}")
+            elif self._pretag(post):
+                print(f"[{i}/{total}] Pre-tagged locally: {post.get('title', 'Untitled')}")
+            elif workers > 1 or batch_size > 1:
+                pending.append(post)
             else:
                 print(f"[{i}/{total}] Tagging: {post.get('title', 'Untitled')}")
-                self.tag_post(post)
-                time.sleep(0.5)  # Rate limiting
-        
+                try:
+                    self._tag_uncached(post)
+                except Exception as e:
+                    print(f"Error tagging post {post.get('title', '')}: {e}")
+                    failures.append((post, e))
+
+        if pending:
+            print(f"Tagging {len(pending)} uncached posts with {workers} workers, "
+                  f"{batch_size} posts per call...")
+            failures.extend(self._tag_concurrently(pending, max(workers, 1), max(batch_size, 1)))
+
+        self.compact()
+        # Publishing reads the default files; a run on another cache file doesn't affect it
+        if self.db is not None or publishes_from(self.cache_file):
+            republish(db=self.db)
         print(f"\nDone! Tagged {len(self.tagged_posts)} posts total.")
+        self._print_report(
+            tagged=total - cached - len(failures),
+            cached=cached,
+            failures=failures,
+            elapsed=time.monotonic() - started,
+            calls=self.api_calls - calls_before,
+            throttled=self.limiter.throttled - throttled_before,
+            pretagged=self.pretagged - pretagged_before
+        )
         return self.tagged_posts
-    
+
+    def _print_report(self, tagged: int, cached: int, failures: List, elapsed: float,
+                      calls: int, throttled: int, pretagged: int = 0):
+        """Summarize throughput and failures for a tagging run"""
+        rate = tagged / elapsed if elapsed > 0 else 0.0
+        print(f"  Newly tagged: {tagged} ({rate:.2f} posts/s over {elapsed:.1f}s)")
+        print(f"  Cached: {cached}")
+        if self.pretagger is not None:
+            print(f"  Pre-tagged locally: {pretagged} (threshold {self.pretagger.threshold})")
+        print(f"  Model calls: {calls} ({throttled} throttled responses)")
+        print(f"  Failed: {len(failures)}")
+        for post, error in failures:
+            print(f"    ✗ {post.get('title', 'Untitled')}: {error}")
+
     def get_all_tags(self) -> List[str]:
         """Get unique list of all tags used"""
-        all_tags = set()
-        for post_data in self.tagged_posts.values():
-            all_tags.update(post_data.get('tags', []))
-        return sorted(list(all_tags))
-    
+        with self._lock:
+            return self.facets.tags.sorted()
+
     def get_all_authors(self) -> List[str]:
         """Get unique list of all authors"""
-        authors = set()
-        for post_data in self.tagged_posts.values():
-            author = post_data.get('author', '')
-            if author:
-                authors.add(author)
-        return sorted(list(authors))
+        with self._lock:
+            return self.facets.authors.sorted()
 
 if __name__ == "__main__":
-    tagger = PostTagger()
-    # Tag ALL posts (869 total)
-    tagger.tag_all_posts(max_posts=None)
+    parser = argparse.ArgumentParser(description="Tag Inkhaven posts with Claude")
+    parser.add_argument('--workers', type=int, default=1, help="concurrent model calls")
+    parser.add_argument('--batch-size', type=int, default=1, help="posts packed into one model call")
+    parser.add_argument('--max-rate', type=float, default=2.0, help="maximum requests per second")
+    parser.add_argument('--max-posts', type=int, default=None, help="only process the first N posts")
+    parser.add_argument('--pretag-threshold', type=float, default=None,
+                        help="tag posts locally when the classifier is this confident; "
+                             "its cross-validated agreement with the model is printed first")
+    args = parser.parse_args()
 
+    db_path = configured_db_path()
+    tagger = PostTagger(max_rate=args.max_rate, db=SQLiteStore(db_path) if db_path else None)
+    if args.pretag_threshold is not None:
+        tagger.pretagger = PreTagger(threshold=args.pretag_threshold).fit(tagger.tagged_posts)
+        # Agreement depends on the cache, so show what this threshold actually buys
+        row = PreTagger.evaluate(tagger.tagged_posts, thresholds=[args.pretag_threshold])[0]
+        print(f"Pre-tagger at threshold {args.pretag_threshold}: tags {row['coverage']:.1%} of posts locally, "
+              f"matching the model's tags exactly on {row['exact_agreement']:.1%} of them "
+              f"(jaccard {row['jaccard']:.1%}, cross-validated on {row['posts']} cached posts)")
+    # Tag ALL posts (869 total)
+    tagger.tag_all_posts(max_posts=args.max_posts, workers=args.workers, batch_size=args.batch_size)
@@ -0,0 +1,264 @@
+"""
+Tests for the tagger and bio generator against a local fake of the API client.
+
+FakeClient stands in for Anthropic(): its messages.create() answers from a
+scripted handler, so throttling, partial batch replies and interrupted runs
+can be reproduced without network access. Backoff sleeps are patched out.
+
+    python -m unittest test_batch_scripts
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+from typing import Callable, List, Optional
+from unittest import mock
+
+from change_log import BIO, POST, ChangeLog
+from generate_author_bios import generate_author_bios
+from journal import journal_path_for
+from model_client import AdaptiveRateLimiter, call_with_retries
+from snapshot_file import SnapshotFile, publish
+from tagger import PostTagger
+
+
+class FakeAPIError(Exception):
+    """Shaped like anthropic's APIStatusError: a status code and a response with headers"""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.response = mock.Mock(headers=headers)
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.content = [mock.Mock(text=text)]
+
+
+class FakeClient:
+    """Records every prompt and answers with handler(prompt), which may raise"""
+
+    def __init__(self, handler: Callable[[str], str]):
+        self.handler = handler
+        self.prompts: List[str] = []
+        self._lock = threading.Lock()
+        self.messages = self
+
+    def create(self, model, max_tokens, messages):
+        prompt = messages[0]['content']
+        with self._lock:
+            self.prompts.append(prompt)
+        return FakeMessage(self.handler(prompt))
+
+
+def feed_post(i: int) -> dict:
+    url = f'https://author{i % 3}.substack.com/p/post-{i}'
+    return {'id': url, 'url': url, 'title': f'Post number {i}',
+            'author': {'name': f'Author {i % 3}'}, 'date_modified': '2025-11-01T00:00:00.000Z'}
+
+
+def batch_size_of(prompt: str) -> int:
+    return len(re.findall(r'^\d+\. Title:', prompt, re.M))
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Runs each test in an empty directory, where the scripts write their files"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._cwd = os.getcwd()
+        os.chdir(self._tmp.name)
+        sleep = mock.patch('model_client.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def tagger(self, client: FakeClient, **kwargs) -> PostTagger:
+        return PostTagger(cache_file='tagged_posts.json', client=client, max_rate=0,
+                          change_log=ChangeLog('changes.jsonl'), **kwargs)
+
+
+class CallWithRetriesTest(TempDirTestCase):
+    def test_backs_off_on_throttling_then_succeeds(self):
+        errors = [FakeAPIError(429, retry_after=3), FakeAPIError(529)]
+
+        def call():
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+
+        limiter = AdaptiveRateLimiter(max_rate=0)
+        self.assertEqual(call_with_retries(call, limiter, base_delay=1.0), 'ok')
+        self.assertEqual(limiter.throttled, 2)
+        self.assertGreater(limiter.interval, limiter.min_interval)
+        # The retry-after header wins over the computed backoff
+        self.assertEqual(self.sleep.call_args_list[0], mock.call(3.0))
+
+    def test_gives_up_after_max_retries(self):
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise FakeAPIError(429)
+
+        with self.assertRaises(FakeAPIError):
+            call_with_retries(call, AdaptiveRateLimiter(max_rate=0), max_retries=2)
+        self.assertEqual(len(calls), 3)
+
+    def test_does_not_retry_client_errors(self):
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise FakeAPIError(400)
+
+        with self.assertRaises(FakeAPIError):
+            call_with_retries(call, AdaptiveRateLimiter(max_rate=0))
+        self.assertEqual(len(calls), 1)
+
+
+class TaggerTest(TempDirTestCase):
+    def test_throttled_batches_are_retried(self):
+        throttles = [FakeAPIError(429), FakeAPIError(429)]
+
+        def handler(prompt):
+            if throttles:
+                raise throttles.pop()
+            return '\n'.join(f'{i}: travel' for i in range(1, batch_size_of(prompt) + 1))
+
+        tagger = self.tagger(FakeClient(handler))
+        posts = [feed_post(i) for i in range(4)]
+        failures = tagger._tag_concurrently(posts, workers=2, batch_size=2)
+
+        self.assertEqual(failures, [])
+        self.assertEqual(tagger.limiter.throttled, 2)
+        self.assertEqual({post_id: record['tags'] for post_id, record in tagger.tagged_posts.items()},
+                         {post['id']: ['travel'] for post in posts})
+
+    def test_partial_batch_reply_tags_missing_posts_individually(self):
+        def handler(prompt):
+            if batch_size_of(prompt):
+                # Skips post 2, garbles a line, answers one out of range and repeats post 1
+                return '1: travel, Humor, not-a-tag\nsure, here you go\n3: history\n7: art\n1: music'
+            return 'philosophy'
+
+        client = FakeClient(handler)
+        tagger = self.tagger(client)
+        posts = [feed_post(i) for i in range(3)]
+        results = tagger._tag_batch(posts)
+
+        self.assertEqual(results, {posts[0]['id']: ['travel', 'humor'],
+                                   posts[1]['id']: ['philosophy'],
+                                   posts[2]['id']: ['history']})
+        self.assertEqual(len(client.prompts), 2)
+        self.assertIn(posts[1]['title'], client.prompts[1])
+        self.assertEqual(tagger.change_log.head(), 3)
+
+    def test_unparseable_tags_default_to_personal(self):
+        tagger = self.tagger(FakeClient(lambda prompt: 'I think this is about cooking'))
+        self.assertEqual(tagger.tag_post(feed_post(0)), ['personal'])
+
+    def test_resumes_from_journal_after_torn_line(self):
+        tagger = self.tagger(FakeClient(lambda prompt: 'travel'), compact_every=100)
+        posts = [feed_post(i) for i in range(3)]
+        for post in posts[:2]:
+            tagger.tag_post(post)
+        # A crash part-way through writing the third record
+        with open(journal_path_for('tagged_posts.json'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'id': posts[2]['id'], 'tags': ['travel']})[:20])
+        self.assertFalse(os.path.exists('tagged_posts.json'))
+
+        client = FakeClient(lambda prompt: 'history')
+        resumed = self.tagger(client)
+        self.assertEqual(set(resumed.tagged_posts), {posts[0]['id'], posts[1]['id']})
+        self.assertEqual(resumed.tag_post(posts[0]), ['travel'])
+        self.assertEqual(resumed.tag_post(posts[2]), ['history'])
+        self.assertEqual(len(client.prompts), 1)
+
+        # Crashing again before compaction keeps the record written after the torn line
+        self.assertEqual(set(self.tagger(client).tagged_posts), {post['id'] for post in posts})
+
+        resumed.compact()
+        with open('tagged_posts.json') as f:
+            self.assertEqual(len(json.load(f)), 3)
+        self.assertFalse(os.path.exists(journal_path_for('tagged_posts.json')))
+
+    def test_run_republishes_snapshot_for_any_spelling_of_the_cache_path(self):
+        with open('inkhaven_feed.json', 'w') as f:
+            json.dump({'items': [feed_post(0)]}, f)
+        publish(force=True)
+        tagger = PostTagger(cache_file=os.path.abspath('tagged_posts.json'), client=FakeClient(lambda p: 'travel'),
+                            max_rate=0, change_log=ChangeLog('changes.jsonl'))
+        tagger.tag_all_posts()
+        self.assertEqual(SnapshotFile().header['post_count'], 1)
+
+
+class AuthorBiosTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        tagged_posts = {}
+        for i in range(6):
+            post = feed_post(i)
+            tagged_posts[post['id']] = {'title': post['title'], 'url': post['url'],
+                                        'author': post['author']['name'], 'tags': ['travel']}
+        with open('tagged_posts.json', 'w') as f:
+            json.dump(tagged_posts, f)
+
+    def test_throttling_and_failures(self):
+        throttled = []
+
+        def handler(prompt):
+            if 'Author 1' in prompt:
+                raise FakeAPIError(400)
+            if 'Author 2' in prompt and not throttled:
+                throttled.append(1)
+                raise FakeAPIError(429, retry_after=1)
+            return 'Writes about travel.'
+
+        bios = generate_author_bios(client=FakeClient(handler), workers=2, max_rate=0)
+
+        self.assertEqual(bios['Author 0'], 'Writes about travel.')
+        self.assertEqual(bios['Author 2'], 'Writes about travel.')
+        self.assertTrue(bios['Author 1'].startswith('Writer exploring'))
+        with open('author_bios.hashes.json') as f:
+            hashes = json.load(f)
+        self.assertIsNone(hashes['Author 1'])
+        self.assertIsNotNone(hashes['Author 0'])
+        _, _, changed = ChangeLog().since(0, ChangeLog().current()[0])
+        self.assertEqual(sorted(changed[BIO]), ['Author 0', 'Author 1', 'Author 2'])
+        self.assertEqual(changed[POST], [])
+
+    def test_rerun_only_retries_failed_authors(self):
+        def handler(prompt):
+            if 'Author 1' in prompt:
+                raise FakeAPIError(400)
+            return 'Writes about travel.'
+
+        generate_author_bios(client=FakeClient(handler), max_rate=0)
+
+        client = FakeClient(lambda prompt: 'Now writes about travel.')
+        bios = generate_author_bios(client=client, max_rate=0)
+        self.assertEqual(len(client.prompts), 1)
+        self.assertIn('Author 1', client.prompts[0])
+        self.assertEqual(bios['Author 1'], 'Now writes about travel.')
+
+    def test_run_republishes_snapshot_for_any_spelling_of_the_bios_path(self):
+        publish(force=True)
+        generate_author_bios(client=FakeClient(lambda prompt: 'Writes about travel.'), max_rate=0,
+                             bios_file=os.path.join('.', 'author_bios.json'))
+        header = SnapshotFile().header
+        self.assertEqual(json.loads(bytes(SnapshotFile().section('payload/author_bios/identity'))),
+                         {f'Author {i}': 'Writes about travel.' for i in range(3)})
+        self.assertEqual(header['post_count'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
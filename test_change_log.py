@@ -0,0 +1,122 @@
+"""
+Tests for the versioned change log behind /api/changes.
+
+    python -m unittest test_change_log
+"""
+
+import os
+import tempfile
+import unittest
+
+from change_log import BIO, COMMUNITY_TAG, POST, ChangeLog
+
+
+class ChangeLogTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, 'changes.jsonl')
+
+    def log(self, **kwargs) -> ChangeLog:
+        return ChangeLog(self.path, **kwargs)
+
+    def test_since_groups_and_dedupes_keys(self):
+        log = self.log()
+        log.record(POST, 'a')
+        log_id, head = log.current()
+        log.record_many(COMMUNITY_TAG, ['a', 'b', 'a'])
+        log.record(BIO, 'Author')
+
+        self.assertEqual(log.since(head, log_id),
+                         (log_id, 5, {POST: [], COMMUNITY_TAG: ['a', 'b'], BIO: ['Author']}))
+        self.assertEqual(log.since(5, log_id), (log_id, 5, {POST: [], COMMUNITY_TAG: [], BIO: []}))
+
+    def test_unknown_log_or_future_version_resyncs(self):
+        log = self.log()
+        log.record(POST, 'a')
+        log_id, head = log.current()
+        self.assertIsNone(log.since(0, 'another-log')[2])
+        self.assertIsNone(log.since(0, '')[2])
+        self.assertIsNone(log.since(head + 1, log_id)[2])
+
+    def test_since_before_a_trim_resyncs(self):
+        log = self.log(keep=3)
+        for i in range(7):
+            log.record(POST, str(i))
+        log_id, head = log.current()
+        self.assertEqual(head, 7)
+
+        # Versions 5-7 are left, so a client at 4 is still served and one at 3 is not
+        self.assertIsNone(log.since(3, log_id)[2])
+        self.assertEqual(log.since(4, log_id)[2][POST], ['4', '5', '6'])
+        # Another process reading the trimmed file from scratch agrees
+        self.assertIsNone(self.log().since(3, log_id)[2])
+        self.assertEqual(self.log().current(), (log_id, 7))
+
+    def test_reset_starts_a_new_log(self):
+        log = self.log()
+        log.record(POST, 'a')
+        old_id, head = log.current()
+
+        version = log.reset()
+        new_id, new_head = log.current()
+        self.assertNotEqual(new_id, old_id)
+        self.assertEqual(version, head + 1)
+        self.assertEqual(new_head, version)
+        self.assertIsNone(log.since(head, old_id)[2])
+        # A client that resyncs after the reset is served from then on
+        log.record(POST, 'b')
+        self.assertEqual(log.since(new_head, new_id)[2][POST], ['b'])
+
+    def test_append_by_another_writer_after_a_cached_read(self):
+        reader, writer = self.log(), self.log()
+        writer.record(POST, 'a')
+        log_id, head = reader.current()
+
+        writer.record_many(POST, ['b', 'c'])
+        self.assertEqual(reader.current(), (log_id, head + 2))
+        self.assertEqual(reader.since(head, log_id)[2][POST], ['b', 'c'])
+
+    def test_torn_append_is_read_once_complete(self):
+        log = self.log()
+        log.record(POST, 'a')
+        log_id, head = log.current()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"v": 2, "kind": "post", ')
+        self.assertEqual(log.current(), (log_id, head))
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('"key": "b"}\n')
+        self.assertEqual(log.since(head, log_id)[2][POST], ['b'])
+
+    def test_atomic_rewrite_by_another_writer_is_reread(self):
+        reader, writer = self.log(), self.log(keep=2)
+        for key in 'abc':
+            writer.record(POST, key)
+        log_id, _ = reader.current()
+        inode = os.stat(self.path).st_ino
+
+        # The fifth record trims, replacing the file; the sixth appends to the new one
+        for key in 'def':
+            writer.record(POST, key)
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(reader.current(), (log_id, 6))
+        # Versions 4-6 are left
+        self.assertEqual(reader.since(3, log_id)[2][POST], ['d', 'e', 'f'])
+        self.assertIsNone(reader.since(2, log_id)[2])
+
+    def test_recreated_log_gets_a_new_id(self):
+        log = self.log()
+        log.record(POST, 'a')
+        old_id, head = log.current()
+        os.remove(self.path)
+        self.assertEqual(log.current(), ('', 0))
+
+        log.record(POST, 'b')
+        new_id, new_head = log.current()
+        self.assertNotEqual(new_id, old_id)
+        self.assertEqual(new_head, head)
+        self.assertIsNone(log.since(head, old_id)[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Tests for PostStore reloading from the SQLite backend.
+
+    python -m unittest test_post_store
+"""
+
+import os
+import tempfile
+import unittest
+
+from post_store import PostStore
+from sqlite_store import SQLiteStore
+
+
+def record(i: int, tags=('travel',)) -> dict:
+    return {'title': f'Post {i}', 'url': f'https://example.com/p/{i}', 'author': f'Author {i % 2}',
+            'date_modified': f'2025-11-{1 + i:02d}T00:00:00.000Z', 'tags': list(tags)}
+
+
+class SQLitePostStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.db = SQLiteStore(os.path.join(self._tmp.name, 'inkhaven.db'))
+        for i in range(5):
+            self.db.upsert_post(f'https://example.com/p/{i}', record(i))
+        self.db.set_author_bios({'Author 0': 'Writes about travel.'})
+        self.store = PostStore(db=self.db)
+
+    def fresh(self):
+        """What a store with nothing cached would serve"""
+        return PostStore(db=self.db).snapshot()
+
+    def assertSameData(self, snapshot, expected):
+        self.assertEqual([post.to_dict() for post in snapshot.posts], [post.to_dict() for post in expected.posts])
+        self.assertEqual(snapshot.positions, expected.positions)
+        self.assertEqual(snapshot.community_tags, expected.community_tags)
+        self.assertEqual(snapshot.facets.counts(), expected.facets.counts())
+        self.assertEqual(snapshot.author_bios, expected.author_bios)
+
+    def test_community_tags_are_applied_incrementally(self):
+        before = self.store.snapshot()
+        self.db.add_community_tag('https://example.com/p/3', 'favourite')
+        self.db.add_community_tag('https://example.com/p/1', 'favourite')
+        self.db.add_community_tag('https://example.com/p/3', 'long-read')
+
+        after = self.store.snapshot()
+        self.assertEqual(self.store.incremental, 1)
+        self.assertIs(after.tagged_posts, before.tagged_posts)
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual(after.posts[after.positions['https://example.com/p/3']]['community_tags'],
+                         ('favourite', 'long-read'))
+        self.assertSameData(after, self.fresh())
+
+    def test_post_and_bio_changes_reload_everything(self):
+        self.store.snapshot()
+        self.db.upsert_post('https://example.com/p/9', record(9, tags=('history',)))
+        snapshot = self.store.snapshot()
+        self.assertEqual(self.store.incremental, 0)
+        self.assertIn('history', snapshot.tags)
+
+        self.db.set_author_bios({'Author 1': 'Writes about history.'})
+        snapshot = self.store.snapshot()
+        self.assertEqual(self.store.incremental, 0)
+        self.assertEqual(snapshot.author_bios['Author 1'], 'Writes about history.')
+        self.assertSameData(snapshot, self.fresh())
+
+    def test_removed_community_tags_reload_everything(self):
+        self.db.add_community_tag('https://example.com/p/2', 'favourite')
+        self.store.snapshot()
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM community_tags WHERE tag = 'favourite'")
+        snapshot = self.store.snapshot()
+        self.assertEqual(self.store.incremental, 0)
+        self.assertEqual(snapshot.community_tags, [])
+
+    def test_unchanged_database_is_a_cache_hit(self):
+        self.store.snapshot()
+        reloads = self.store.reloads
+        self.store.snapshot()
+        self.assertEqual(self.store.reloads, reloads)
+        self.assertEqual(self.store.hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
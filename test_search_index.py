@@ -0,0 +1,62 @@
+"""
+Tests for the server-side title match, which must agree with the page's.
+
+    python -m unittest test_search_index
+"""
+
+import unittest
+
+from compact import Post
+from search_index import VERIFY_RATIO, SearchIndex
+
+TITLES = ['Travelling through Kyōto', 'A history of travel', 'Unravel the knot',
+          'C++ for beginners', 'Notes from Zürich', 'travel_log: day 1']
+
+
+def index() -> SearchIndex:
+    posts = [Post.from_record(f'https://example.com/p/{i}',
+                              {'title': title, 'tags': ['travel' if i % 2 else 'history']})
+             for i, title in enumerate(TITLES)]
+    return SearchIndex(posts)
+
+
+def titles(index: SearchIndex, **kwargs):
+    return [index.posts[pos]['title'] for pos in index.match(**kwargs)]
+
+
+class TitleMatchTest(unittest.TestCase):
+    def test_words_match_the_start_of_title_words(self):
+        idx = index()
+        self.assertEqual(titles(idx, query='trav'),
+                         ['Travelling through Kyōto', 'A history of travel', 'travel_log: day 1'])
+        # Not a word start, so no substring hit on "Unravel"
+        self.assertEqual(titles(idx, query='ravel'), [])
+        self.assertEqual(titles(idx, query='TRAVEL_'), ['travel_log: day 1'])
+
+    def test_every_word_must_match(self):
+        idx = index()
+        self.assertEqual(titles(idx, query='hist trav'), ['A history of travel'])
+        self.assertEqual(titles(idx, query='  of   a '), ['A history of travel'])
+        self.assertEqual(titles(idx, query='travel knot'), [])
+
+    def test_unicode_words(self):
+        idx = index()
+        self.assertEqual(titles(idx, query='kyō'), ['Travelling through Kyōto'])
+        self.assertEqual(titles(idx, query='zür'), ['Notes from Zürich'])
+
+    def test_query_without_words_is_a_substring(self):
+        idx = index()
+        self.assertEqual(titles(idx, query=' ++ '), ['C++ for beginners'])
+        self.assertEqual(titles(idx, query='   '), TITLES)
+
+    def test_few_candidates_are_checked_directly(self):
+        # Three tagged candidates against a word with far more postings
+        trips = [Post.from_record(f'https://example.com/q/{i}', {'title': 'Trip'}) for i in range(3 * VERIFY_RATIO)]
+        idx = SearchIndex(index().posts + trips)
+        self.assertEqual(titles(idx, tags=['history'], query='tr'), ['Travelling through Kyōto'])
+        self.assertEqual(titles(idx, tags=['history'], query='tr ky'), ['Travelling through Kyōto'])
+        self.assertEqual(titles(idx, tags=['history'], query='ravel'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
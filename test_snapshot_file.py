@@ -0,0 +1,165 @@
+"""
+Round-trip tests for snapshot.bin: a published snapshot must serve exactly
+what parsing the source files would.
+
+    python -m unittest test_snapshot_file
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from change_log import ChangeLog
+from community_log import CommunityTagLog
+from http_cache import EncodedPayload, json_chunks
+from post_store import PostStore, bootstrap_data, bootstrap_memo_key
+from search_index import SearchIndex
+from snapshot_file import MappedPostStore, MappedSnapshot, SnapshotFile, publish, publishes_from
+
+# Text that once confused splicing the posts into the bootstrap body
+POSTS_KEY = '"posts":[]'
+
+
+def corpus(num_posts: int):
+    tagged_posts = {}
+    for i in range(num_posts):
+        url = f'https://author{i % 4}.example.com/p/{i}'
+        tagged_posts[url] = {'title': f'Post {i} — ünïcode {POSTS_KEY}', 'url': url, 'author': f'Author {i % 4}',
+                             'date_modified': f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00.000Z',
+                             'tags': ['travel', 'history'][:1 + i % 2]}
+    # Extra fields and missing ones must round-trip too
+    first = next(iter(tagged_posts.values()))
+    first['subtitle'] = 'kept as is'
+    del next(reversed(tagged_posts.values()))['date_modified']
+    community_tags = {url: ['favourite'] for url in list(tagged_posts)[::5]}
+    author_bios = {f'Author {i}': f'Bio {i} {POSTS_KEY}' for i in range(4)}
+    return tagged_posts, community_tags, author_bios
+
+
+def payloads(snapshot, change_log_id: str, change_version: int):
+    """Identity bodies of every memoized payload, built the way server.py builds them"""
+    builds = {
+        ('payload', 'posts'): lambda: snapshot.posts,
+        ('payload', 'tags'): lambda: snapshot.tags,
+        ('payload', 'authors'): lambda: snapshot.authors,
+        ('payload', 'community_tags'): lambda: snapshot.community_tags,
+        ('payload', 'facets'): lambda: snapshot.facets.counts(),
+        ('payload', 'author_bios'): lambda: snapshot.author_bios,
+        bootstrap_memo_key(change_log_id, change_version):
+            lambda: bootstrap_data(snapshot, change_log_id, change_version),
+        ('payload', 'search_index'):
+            lambda: SearchIndex(list(snapshot.posts), snapshot.version).client_index(),
+    }
+    bodies = {}
+    for key, build in builds.items():
+        payload = snapshot.memo(key, lambda: EncodedPayload.from_data(build(), snapshot.last_modified))
+        bodies[key[1]] = bytes(payload.variant('identity'))
+    return bodies
+
+
+class SnapshotFileTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._cwd = os.getcwd()
+        os.chdir(self._tmp.name)
+        self.write_corpus(40)
+        ChangeLog().record('post', 'https://author0.example.com/p/0')
+        publish(force=True)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def write_corpus(self, num_posts: int):
+        for name, data in zip(('tagged_posts.json', 'community_tags.json', 'author_bios.json'), corpus(num_posts)):
+            with open(name, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+
+    def assertServesLikeParsed(self, snapshot):
+        expected = PostStore().snapshot()
+        change_log_id, change_version = ChangeLog().current()
+        self.assertEqual(snapshot.version, expected.version)
+        self.assertEqual(payloads(snapshot, change_log_id, change_version),
+                         payloads(expected, change_log_id, change_version))
+
+        self.assertEqual([post.to_dict() for post in snapshot.posts], [post.to_dict() for post in expected.posts])
+        for pos in (0, 7, len(expected.posts) - 1, -1):
+            self.assertEqual(snapshot.posts[pos].to_dict(), expected.posts[pos].to_dict())
+        self.assertEqual(dict(snapshot.positions), expected.positions)
+        self.assertIsNone(snapshot.positions.get('https://nowhere.example.com/'))
+        self.assertEqual(snapshot.community_map, expected.community_map)
+        self.assertEqual(snapshot.facets.counts(), expected.facets.counts())
+
+        if isinstance(snapshot, MappedSnapshot):
+            for ndjson in (False, True):
+                self.assertEqual(b''.join(snapshot.posts_chunks(ndjson)),
+                                 b''.join(json_chunks(expected.posts, ndjson)))
+
+    def test_published_snapshot_matches_parsed(self):
+        snapshot = MappedPostStore().snapshot()
+        self.assertIsInstance(snapshot, MappedSnapshot)
+        self.assertFalse(snapshot.posts.overrides)
+        self.assertServesLikeParsed(snapshot)
+
+    def test_community_journal_append_is_applied_on_top(self):
+        store = MappedPostStore()
+        store.snapshot()
+        log = CommunityTagLog()
+        log.add('https://author1.example.com/p/1', 'favourite')
+        log.add('https://author1.example.com/p/1', POSTS_KEY)
+        # Already tagged, and a post that does not exist
+        log.add('https://author0.example.com/p/0', 'favourite')
+        log.add('https://nowhere.example.com/', 'lost')
+
+        snapshot = store.snapshot()
+        self.assertIsInstance(snapshot, MappedSnapshot)
+        self.assertEqual(set(snapshot.posts.overrides), {snapshot.positions['https://author1.example.com/p/1']})
+        self.assertEqual(store.incremental, 1)
+        self.assertServesLikeParsed(snapshot)
+
+        # Republishing from the overlay serves the shared file again
+        publish(store=store)
+        snapshot = MappedPostStore().snapshot()
+        self.assertFalse(snapshot.posts.overrides)
+        self.assertServesLikeParsed(snapshot)
+
+    def test_compacted_journal_falls_back_to_parsing(self):
+        store = MappedPostStore()
+        store.snapshot()
+        log = CommunityTagLog()
+        log.add('https://author1.example.com/p/1', 'favourite')
+        log.compact()
+        snapshot = store.snapshot()
+        self.assertNotIsInstance(snapshot, MappedSnapshot)
+        self.assertServesLikeParsed(snapshot)
+
+    def test_changed_sources_fall_back_to_parsing(self):
+        store = MappedPostStore()
+        self.assertIsInstance(store.snapshot(), MappedSnapshot)
+        self.write_corpus(41)
+        snapshot = store.snapshot()
+        self.assertNotIsInstance(snapshot, MappedSnapshot)
+        self.assertEqual(len(snapshot.posts), 41)
+        self.assertServesLikeParsed(snapshot)
+
+        publish()
+        snapshot = store.snapshot()
+        self.assertIsInstance(snapshot, MappedSnapshot)
+        self.assertServesLikeParsed(snapshot)
+
+    def test_publish_skips_an_up_to_date_file(self):
+        self.assertIsNone(publish())
+        ChangeLog().record('post', 'https://author0.example.com/p/0')
+        self.assertIsNotNone(publish())
+        self.assertEqual(SnapshotFile().header['change_version'], 2)
+
+    def test_publishes_from_resolves_paths(self):
+        self.assertTrue(publishes_from('tagged_posts.json'))
+        self.assertTrue(publishes_from(os.path.abspath('author_bios.json')))
+        self.assertTrue(publishes_from(os.path.join('.', 'community_tags.json')))
+        self.assertFalse(publishes_from('other_posts.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()